@@ -0,0 +1,191 @@
+"""
+Scheduled Lambda function scaling the query capacity units of a Kendra index.
+Reads the query rate of the index from CloudWatch and calls UpdateIndex when it leaves the
+band between SCALE_DOWN_UTILIZATION and TARGET_UTILIZATION of the provisioned capacity.
+Scale-ups and scale-downs have separate cool-downs, counted from the last update of the index.
+
+The policy (decide_capacity) is a pure function; replay_policy runs it against a recorded
+metric series so that thresholds can be tuned offline.
+"""
+import datetime
+import json
+import logging
+import math
+import os
+import boto3
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Queries per second of the base capacity of each edition and of one query capacity unit
+EDITION_QPS = {'DEVELOPER_EDITION': 0.05, 'ENTERPRISE_EDITION': 0.1}
+QPS_PER_QUERY_UNIT = 0.1
+
+INDEX_ID = os.environ.get('KENDRA_INDEX', '')
+METRIC_NAME = os.environ.get('METRIC_NAME', 'IndexQueryCount')
+METRIC_PERIOD = int(os.environ.get('METRIC_PERIOD', '300'))
+MIN_QUERY_UNITS = int(os.environ.get('MIN_QUERY_UNITS', '0'))
+MAX_QUERY_UNITS = int(os.environ.get('MAX_QUERY_UNITS', '10'))
+TARGET_UTILIZATION = float(os.environ.get('TARGET_UTILIZATION', '0.7'))
+SCALE_DOWN_UTILIZATION = float(os.environ.get('SCALE_DOWN_UTILIZATION', '0.4'))
+SCALE_UP_COOLDOWN = float(os.environ.get('SCALE_UP_COOLDOWN', '900'))
+SCALE_DOWN_COOLDOWN = float(os.environ.get('SCALE_DOWN_COOLDOWN', '3600'))
+
+kendra_client = boto3.client('kendra')
+cloudwatch_client = boto3.client('cloudwatch')
+
+
+def get_capacity_qps(edition, query_units):
+    """
+    :param edition: Kendra index edition
+    :param query_units: Additional query capacity units
+    :return: Queries per second the index can serve
+    """
+    return EDITION_QPS[edition] + query_units * QPS_PER_QUERY_UNIT
+
+
+def get_required_units(edition, qps, utilization):
+    """
+    :param edition: Kendra index edition
+    :param qps: Observed queries per second
+    :param utilization: Utilization the capacity should run at
+    :return: Query capacity units serving qps at the utilization
+    """
+    missing_qps = qps / utilization - EDITION_QPS[edition]
+    return max(int(math.ceil(round(missing_qps / QPS_PER_QUERY_UNIT, 6))), 0)
+
+
+def decide_capacity(edition, qps, current_units, seconds_since_change, policy):
+    """
+    Decides the query capacity units of the index.
+    Scales up to the units serving qps at the target utilization once the utilization exceeds
+    it, and down to those units once the utilization falls below the scale-down utilization.
+    In between the capacity is kept (hysteresis).
+    :param edition: Kendra index edition
+    :param qps: Observed queries per second (peak of the metric window)
+    :param current_units: Current query capacity units
+    :param seconds_since_change: Seconds since the last capacity change
+    :param policy: Dict with minUnits, maxUnits, targetUtilization, scaleDownUtilization,
+                   scaleUpCooldown and scaleDownCooldown
+    :return: Tuple of (query capacity units, reason)
+    """
+    utilization = qps / get_capacity_qps(edition, current_units)
+    desired = min(max(get_required_units(edition, qps, policy['targetUtilization']),
+                      policy['minUnits']), policy['maxUnits'])
+    if current_units < policy['minUnits'] or current_units > policy['maxUnits']:
+        return desired, 'out of bounds'
+    if utilization > policy['targetUtilization'] and desired > current_units:
+        if seconds_since_change < policy['scaleUpCooldown']:
+            return current_units, 'scale-up cooldown'
+        return desired, 'scale up'
+    if utilization < policy['scaleDownUtilization'] and desired < current_units:
+        if seconds_since_change < policy['scaleDownCooldown']:
+            return current_units, 'scale-down cooldown'
+        return desired, 'scale down'
+    if utilization > policy['targetUtilization'] and current_units == policy['maxUnits']:
+        return current_units, 'at maximum'
+    return current_units, 'within band'
+
+
+def replay_policy(edition, series, initial_units, policy, period=METRIC_PERIOD):
+    """
+    Runs the policy against a recorded metric series, one decision per data point.
+    Capacity changes take effect from the next data point.
+    :param edition: Kendra index edition
+    :param series: List of query counts per period
+    :param initial_units: Query capacity units at the start of the series
+    :param policy: Policy dict of decide_capacity
+    :param period: Seconds per data point
+    :return: List of dicts with qps, units, utilization, throttled (qps above capacity)
+             and reason per data point
+    """
+    units = initial_units
+    last_change = -float('inf')
+    timeline = []
+    for position, count in enumerate(series):
+        now = position * period
+        qps = float(count) / period
+        capacity = get_capacity_qps(edition, units)
+        decided, reason = decide_capacity(edition, qps, units, now - last_change, policy)
+        timeline.append({'qps': qps, 'units': units, 'utilization': qps / capacity,
+                         'throttled': qps > capacity, 'reason': reason})
+        if decided != units:
+            units, last_change = decided, now
+    return timeline
+
+
+def get_policy():
+    """
+    :return: Policy dict configured by the environment
+    """
+    return {
+        'minUnits': MIN_QUERY_UNITS,
+        'maxUnits': MAX_QUERY_UNITS,
+        'targetUtilization': TARGET_UTILIZATION,
+        'scaleDownUtilization': SCALE_DOWN_UTILIZATION,
+        'scaleUpCooldown': SCALE_UP_COOLDOWN,
+        'scaleDownCooldown': SCALE_DOWN_COOLDOWN
+    }
+
+
+def get_query_rate(index_id, now):
+    """
+    Gets the peak query rate of the index over the last scale-up cool-down.
+    :param index_id: Kendra Index Id
+    :param now: Current time (datetime, UTC)
+    :return: Queries per second, None if the metric has no data points
+    """
+    response = cloudwatch_client.get_metric_statistics(
+        Namespace='AWS/Kendra',
+        MetricName=METRIC_NAME,
+        Dimensions=[{'Name': 'IndexId', 'Value': index_id}],
+        StartTime=now - datetime.timedelta(seconds=max(SCALE_UP_COOLDOWN, METRIC_PERIOD)),
+        EndTime=now,
+        Period=METRIC_PERIOD,
+        Statistics=['Sum'])
+    datapoints = response['Datapoints']
+    if not datapoints:
+        return None
+    return max(datapoint['Sum'] for datapoint in datapoints) / METRIC_PERIOD
+
+
+def scale_index(index_id):
+    """
+    Applies the policy to the index.
+    :param index_id: Kendra Index Id
+    :return: Decision summary
+    """
+    index = kendra_client.describe_index(Id=index_id)
+    if index['Status'] != 'ACTIVE':
+        return {'indexId': index_id, 'reason': 'index is ' + index['Status']}
+    if index['Edition'] != 'ENTERPRISE_EDITION':
+        return {'indexId': index_id, 'reason': 'capacity units need ENTERPRISE_EDITION'}
+
+    capacity_units = dict(index.get('CapacityUnits') or
+                          {'QueryCapacityUnits': 0, 'StorageCapacityUnits': 0})
+    current_units = capacity_units['QueryCapacityUnits']
+    now = datetime.datetime.now(datetime.timezone.utc)
+    qps = get_query_rate(index_id, now)
+    if qps is None:
+        return {'indexId': index_id, 'units': current_units, 'reason': 'no metric data'}
+
+    seconds_since_change = (now - index['UpdatedAt']).total_seconds()
+    units, reason = decide_capacity(index['Edition'], qps, current_units, seconds_since_change,
+                                    get_policy())
+    if units != current_units:
+        capacity_units['QueryCapacityUnits'] = units
+        kendra_client.update_index(Id=index_id, CapacityUnits=capacity_units)
+    return {'indexId': index_id, 'qps': qps, 'previousUnits': current_units, 'units': units,
+            'reason': reason}
+
+
+def lambda_handler(event, _):
+    """
+    Lambda handler, invoked by the scaling schedule.
+    :param event: Scheduled event, may set 'indexId'
+    :param _: Context (unused)
+    :return: Decision summary
+    """
+    decision = scale_index(event.get('indexId', INDEX_ID))
+    logger.info('Capacity decision: %s', json.dumps(decision))
+    return decision
@@ -1,13 +1,20 @@
 """
-Python script for Lambda backed custom resource to create/delete:
-Kendra Index
-Data source for Kendra Index
-FAQ for Kendra Index
+Python script for Lambda backed custom resources to create/delete:
+Kendra Index (Custom::KendraCustomResource)
+Data source and FAQ for Kendra Index (Custom::KendraIndexReadiness)
+
+The index resource completes as soon as the index is created, so that resources which only
+need the index ID can be provisioned while it is CREATING. The readiness resource waits for
+the index to become ACTIVE, then creates the data source and the FAQ, and writes the document
+manifest used by the fulfillment Lambda to render links. A data source or FAQ which already
+exists under the same name (e.g. on stacks created before the readiness resource) is reused.
 """
 import os
 import logging
 import boto3
 import time
+import fnmatch
+import sqlite3
 from botocore import exceptions as botocore_exceptions
 from boto3 import exceptions as boto3_exceptions
 from crhelper import CfnResource
@@ -19,10 +26,26 @@ helper = CfnResource(json_logging=False, log_level='DEBUG',
 try:
     kendra_client = boto3.client('kendra', os.environ['AWS_REGION'])
     cloudformation_client = boto3.client('cloudformation', os.environ['AWS_REGION'])
+    s3_client = boto3.client('s3', os.environ['AWS_REGION'])
 except (botocore_exceptions.BotoCoreError, botocore_exceptions.ClientError,
         boto3_exceptions.Boto3Error) as exception:
     helper.init_failure(exception)
 
+READINESS_RESOURCE_TYPE = 'Custom::KendraIndexReadiness'
+# Properties of the index itself, changes to any other index resource property are ignored;
+# stacks created before the readiness resource also passed the data source and FAQ ones
+INDEX_PROPERTIES = ('IndexName', 'Edition', 'IndexRoleArn', 'IndexDescription')
+# Readiness properties that can be updated in place, all other changes are rejected
+CAPACITY_PROPERTIES = ('QueryCapacityUnits', 'StorageCapacityUnits')
+# Document manifest, stored in the documents bucket outside of the data source
+MANIFEST_KEY = 'kendra-manifest/manifest.sqlite'
+MANIFEST_PATH = '/tmp/document_manifest.sqlite'
+MANIFEST_EXCLUSION_PATTERN = 'kendra-manifest/*'
+DATA_SOURCE_EXCLUSION_PATTERNS = ['*faq*', '*FAQ*', MANIFEST_EXCLUSION_PATTERN]
+SLEEP_TIME = 15
+INDEX_UPDATE_TIMEOUT = 600
+CAPACITY_UPDATE_ATTEMPTS = 3
+
 
 def check_required_properties(dictionary, key):
     """
@@ -57,11 +80,96 @@ def create_kendra_index(resource_properties):
     return response_kendra['Id']
 
 
+def get_capacity_units(resource_properties):
+    """
+    Gets the additional capacity units requested for the index.
+    CloudFormation passes numbers as strings.
+    :param resource_properties: Dictionary of resources properties.
+                                QueryCapacityUnits and StorageCapacityUnits are optional.
+    :return: CapacityUnits dict for update_index, or None if no additional capacity is requested
+    """
+    capacity_units = {
+        'QueryCapacityUnits': int(resource_properties.get('QueryCapacityUnits', 0)),
+        'StorageCapacityUnits': int(resource_properties.get('StorageCapacityUnits', 0))
+    }
+    if not any(capacity_units.values()):
+        return None
+    if resource_properties['Edition'] != 'ENTERPRISE_EDITION':
+        raise ValueError("Capacity units are only supported for ENTERPRISE_EDITION indexes")
+    return capacity_units
+
+
+def update_kendra_index_capacity(kendra_index_id, capacity_units):
+    """
+    Sets the additional query and storage capacity units of the index.
+    Kendra only accepts capacity units once the index is ACTIVE.
+    :param kendra_index_id: Kendra Index Id
+    :param capacity_units: CapacityUnits dict
+    :return: None
+    """
+    kendra_client.update_index(Id=kendra_index_id, CapacityUnits=capacity_units)
+    logger.info('Updated capacity of index %s to %s', kendra_index_id, str(capacity_units))
+
+
+def wait_for_kendra_index_active(kendra_index_id):
+    """
+    Waits while the index is UPDATING, e.g. while a capacity change of the capacity scaler
+    is applied.
+    Raises an exception if the index is neither ACTIVE nor UPDATING, or still UPDATING after
+    INDEX_UPDATE_TIMEOUT seconds.
+    :param kendra_index_id: Kendra Index Id
+    :return: describe_index response of the ACTIVE index
+    """
+    deadline = time.time() + INDEX_UPDATE_TIMEOUT
+    while True:
+        response = kendra_client.describe_index(Id=kendra_index_id)
+        status = response['Status']
+        if status == 'ACTIVE':
+            return response
+        if status != 'UPDATING':
+            raise Exception("Kendra Index is in " + status + " state")
+        if time.time() >= deadline:
+            raise Exception("Kendra Index is still UPDATING after " +
+                            str(INDEX_UPDATE_TIMEOUT) + " seconds")
+        time.sleep(SLEEP_TIME)
+
+
+def change_kendra_index_capacity(kendra_index_id, old_properties, new_properties):
+    """
+    Applies a capacity change of the readiness resource.
+    The query capacity units are only set when QueryCapacityUnits changed, so that a change of
+    the storage capacity units keeps the query capacity units the capacity scaler set.
+    UpdateIndex is retried while a concurrent update of the index is in progress.
+    :param kendra_index_id: Kendra Index Id
+    :param old_properties: Resource properties before the update
+    :param new_properties: Resource properties after the update
+    :return: None
+    """
+    capacity_units = get_capacity_units(new_properties) or \
+        {'QueryCapacityUnits': 0, 'StorageCapacityUnits': 0}
+    query_units_changed = int(old_properties.get('QueryCapacityUnits', 0)) != \
+        int(new_properties.get('QueryCapacityUnits', 0))
+    for attempt in range(1, CAPACITY_UPDATE_ATTEMPTS + 1):
+        index = wait_for_kendra_index_active(kendra_index_id)
+        if not query_units_changed:
+            current_units = index.get('CapacityUnits') or {}
+            capacity_units['QueryCapacityUnits'] = current_units.get('QueryCapacityUnits', 0)
+        try:
+            update_kendra_index_capacity(kendra_index_id, capacity_units)
+            return
+        except kendra_client.exceptions.ConflictException:
+            if attempt == CAPACITY_UPDATE_ATTEMPTS:
+                raise
+            logger.info('Index %s is being updated, retrying capacity update', kendra_index_id)
+            time.sleep(SLEEP_TIME)
+
+
 @helper.create
 def create(event, _):
     """
     Helper function for resource creation.
     Populates Data with Kendra Index Id so poll_create helper can refer to it.
+    The index resource creates the index; the readiness resource refers to an existing one.
     Raises Exception if required resource properties are missing.
     Any exception raised is displayed in CloudFormation console.
     :param event: Event body
@@ -72,19 +180,27 @@ def create(event, _):
 
     if 'ResourceProperties' not in event:
         raise ValueError("Please provide resource properties")
-    required_properties = ['IndexName',
-                           'Edition',
-                           'IndexRoleArn',
-                           'DataSourceName',
-                           'KendraS3Bucket',
-                           'DataSourceRoleArn',
-                           'FAQName',
-                           'FAQRoleArn',
-                           'FAQFileKey']
+    if is_readiness_resource(event):
+        required_properties = ['IndexId',
+                               'Edition',
+                               'DataSourceName',
+                               'KendraS3Bucket',
+                               'DataSourceRoleArn',
+                               'FAQName',
+                               'FAQRoleArn',
+                               'FAQFileKey']
+    else:
+        required_properties = ['IndexName',
+                               'Edition',
+                               'IndexRoleArn']
     for resource_property in required_properties:
         check_required_properties(event['ResourceProperties'], resource_property)
 
-    kendra_index_id = create_kendra_index(event['ResourceProperties'])
+    if is_readiness_resource(event):
+        get_capacity_units(event['ResourceProperties'])  # Fail before waiting for the index
+        kendra_index_id = event['ResourceProperties']['IndexId']
+    else:
+        kendra_index_id = create_kendra_index(event['ResourceProperties'])
 
     # To add response data update the helper.Data dict
     # If poll is enabled data is placed into poll event as event['CrHelperData']
@@ -100,14 +216,44 @@ def delete_kendra_index(kendra_index_id):
     kendra_client.delete_index(Id=kendra_index_id)
 
 
+def is_readiness_resource(event):
+    """
+    :param event: Event body
+    :return: True for the readiness resource, False for the index resource
+    """
+    return event.get('ResourceType') == READINESS_RESOURCE_TYPE
+
+
 @helper.update
-def update(*_):
+def update(event, _):
     """
     Helper function for resource updates.
-    Updates are not supported for Kendra custom resource.
-    :param _: Unused
+    Only capacity unit changes of the readiness resource are supported for Kendra custom
+    resources.
+    :param event: Event body
+    :param _: Context (unused)
     :return: None
     """
+    # crhelper resets Data on updates; keep the KendraIndexId attribute of the resource
+    if is_readiness_resource(event):
+        helper.Data['KendraIndexId'] = event['ResourceProperties']['IndexId']
+        old_properties = {key: value for key, value in event['OldResourceProperties'].items()
+                          if key not in CAPACITY_PROPERTIES}
+        new_properties = {key: value for key, value in event['ResourceProperties'].items()
+                          if key not in CAPACITY_PROPERTIES}
+        if old_properties == new_properties:
+            change_kendra_index_capacity(event['ResourceProperties']['IndexId'],
+                                         event['OldResourceProperties'],
+                                         event['ResourceProperties'])
+            return event['PhysicalResourceId']
+    else:
+        helper.Data['KendraIndexId'] = event['PhysicalResourceId']
+        old_properties = {key: value for key, value in event['OldResourceProperties'].items()
+                          if key in INDEX_PROPERTIES}
+        new_properties = {key: value for key, value in event['ResourceProperties'].items()
+                          if key in INDEX_PROPERTIES}
+        if old_properties == new_properties:
+            return event['PhysicalResourceId']
     cft_response = cloudformation_client.describe_stacks(
         StackName=helper.StackId
     )
@@ -127,6 +273,8 @@ def delete(event, _):
     :return: None
     """
     logger.info("Got Delete")
+    if is_readiness_resource(event):
+        return  # Data source and FAQ are deleted with the index
     delete_kendra_index(event['PhysicalResourceId'])
 
 
@@ -163,10 +311,7 @@ def create_kendra_data_source(kendra_index_id, resource_properties):
         'Configuration': {
             'S3Configuration': {
                 'BucketName': resource_properties['KendraS3Bucket'],
-                'ExclusionPatterns': [
-                    '*faq*',
-                    '*FAQ*'
-                ]
+                'ExclusionPatterns': DATA_SOURCE_EXCLUSION_PATTERNS
             },
         },
         'RoleArn': resource_properties['DataSourceRoleArn']
@@ -185,6 +330,48 @@ def create_kendra_data_source(kendra_index_id, resource_properties):
     return response_data_source['Id']
 
 
+def get_kendra_data_source_id(kendra_index_id, data_source_name):
+    """
+    Finds a data source of the index by name.
+    :param kendra_index_id: Kendra Index Id
+    :param data_source_name: Data Source Name
+    :return: Data Source Id, or None if the index has no such data source
+    """
+    kwargs = {'IndexId': kendra_index_id}
+    while True:
+        response = kendra_client.list_data_sources(**kwargs)
+        for data_source in response.get('SummaryItems', []):
+            if data_source['Name'] == data_source_name:
+                return data_source['Id']
+        if not response.get('NextToken'):
+            return None
+        kwargs['NextToken'] = response['NextToken']
+
+
+def exclude_manifest_from_data_source(kendra_index_id, data_source_id):
+    """
+    Adds the manifest exclusion pattern to a reused S3 data source created without it, so
+    that the data source does not sync the document manifest.
+    :param kendra_index_id: Kendra Index Id
+    :param data_source_id: Data Source Id
+    :return: True if the data source excludes the manifest, False otherwise
+    """
+    response = kendra_client.describe_data_source(Id=data_source_id, IndexId=kendra_index_id)
+    configuration = response.get('Configuration') or {}
+    s3_configuration = configuration.get('S3Configuration')
+    if response.get('Type') != 'S3' or not s3_configuration:
+        return False
+    exclusion_patterns = s3_configuration.get('ExclusionPatterns') or []
+    if MANIFEST_EXCLUSION_PATTERN in exclusion_patterns:
+        return True
+    s3_configuration['ExclusionPatterns'] = exclusion_patterns + [MANIFEST_EXCLUSION_PATTERN]
+    kendra_client.update_data_source(Id=data_source_id, IndexId=kendra_index_id,
+                                     Configuration=configuration)
+    logger.info('Added %s to the exclusion patterns of DataSourceId: %s',
+                MANIFEST_EXCLUSION_PATTERN, data_source_id)
+    return True
+
+
 def start_data_source_sync_job(kendra_index_id, data_source_id):
     """
     Starts Data Source Sync Job
@@ -226,30 +413,119 @@ def create_kendra_faq(kendra_index_id, resource_properties):
     return response_faq['Id']
 
 
+def get_kendra_faq_id(kendra_index_id, faq_name):
+    """
+    Finds an FAQ of the index by name.
+    :param kendra_index_id: Kendra Index Id
+    :param faq_name: FAQ Name
+    :return: FAQ Id, or None if the index has no such FAQ
+    """
+    kwargs = {'IndexId': kendra_index_id}
+    while True:
+        response = kendra_client.list_faqs(**kwargs)
+        for faq in response.get('FaqSummaryItems', []):
+            if faq['Name'] == faq_name:
+                return faq['Id']
+        if not response.get('NextToken'):
+            return None
+        kwargs['NextToken'] = response['NextToken']
+
+
+def write_document_manifest(bucket_name):
+    """
+    Writes the manifest of the documents the data source syncs from the bucket: a sqlite
+    table keyed by Kendra document ID (s3://<bucket>/<key>) holding the S3 key, title, size
+    and last-modified time of each document.
+    :param bucket_name: Name of the documents bucket
+    :return: Number of documents in the manifest
+    """
+    if os.path.exists(MANIFEST_PATH):
+        os.remove(MANIFEST_PATH)
+    connection = sqlite3.connect(MANIFEST_PATH)
+    try:
+        connection.execute('CREATE TABLE documents (document_id TEXT PRIMARY KEY, s3_key TEXT, '
+                           'title TEXT, size INTEGER, last_modified REAL)')
+        count = 0
+        for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket_name):
+            rows = []
+            for s3_object in page.get('Contents', []):
+                key = s3_object['Key']
+                if key.endswith('/') or any(fnmatch.fnmatch(key, pattern)
+                                            for pattern in DATA_SOURCE_EXCLUSION_PATTERNS):
+                    continue
+                rows.append(('s3://' + bucket_name + '/' + key, key,
+                             os.path.splitext(os.path.basename(key))[0], s3_object['Size'],
+                             s3_object['LastModified'].timestamp()))
+            connection.executemany('INSERT INTO documents VALUES (?, ?, ?, ?, ?)', rows)
+            count += len(rows)
+        connection.commit()
+    finally:
+        connection.close()
+    with open(MANIFEST_PATH, 'rb') as manifest_file:
+        s3_client.put_object(Bucket=bucket_name, Key=MANIFEST_KEY, Body=manifest_file.read())
+    logger.info('Wrote manifest of %d documents to s3://%s/%s', count, bucket_name, MANIFEST_KEY)
+    return count
+
+
 @helper.poll_create
 def poll_create(event, _):
     """
     Helper function for resource creation, triggered every 2 minutes till resource is created.
-    Populates Data with Data Source Id, Sync Execution Id and FAQ Id.
+    The index resource completes on the first poll.
+    The readiness resource populates Data with Data Source Id, Sync Execution Id and FAQ Id
+    once the index is ACTIVE. An existing data source or FAQ of the same name is reused, and
+    no sync is started for an existing data source.
     Any exception raised is displayed in CloudFormation console.
     :param event: Event body
     :param _: Context (unused)
     :return: None if Index is still being created.
-             Physical Resource (Kendra IndexId) upon successful completion.
+             Physical Resource (Kendra IndexId, suffixed with /readiness for the readiness
+             resource) upon successful completion.
     """
     logger.info("Got create poll")
     kendra_index_id = event['CrHelperData']['KendraIndexId']
+    if not is_readiness_resource(event):
+        return kendra_index_id
     if not check_kendra_index_status(kendra_index_id):
         return None
 
-    data_source_id = create_kendra_data_source(kendra_index_id, event['ResourceProperties'])
+    resource_properties = event['ResourceProperties']
+    data_source_id = get_kendra_data_source_id(kendra_index_id,
+                                               resource_properties['DataSourceName'])
+    if data_source_id is None:
+        data_source_id = create_kendra_data_source(kendra_index_id, resource_properties)
+        helper.Data['SyncExecutionId'] = start_data_source_sync_job(kendra_index_id,
+                                                                    data_source_id)
+        manifest_excluded = True
+    else:
+        logger.info('Reusing DataSourceId: %s', data_source_id)
+        manifest_excluded = False
     helper.Data['DataSourceId'] = data_source_id
+    helper.Data['ManifestDocuments'] = 0
+    try:
+        # The manifest is optional: the fulfillment Lambda falls back to the document ID
+        if manifest_excluded or exclude_manifest_from_data_source(kendra_index_id,
+                                                                  data_source_id):
+            helper.Data['ManifestDocuments'] = write_document_manifest(
+                resource_properties['KendraS3Bucket'])
+        else:
+            logger.error('Document manifest not written: DataSourceId %s does not exclude %s',
+                         data_source_id, MANIFEST_EXCLUSION_PATTERN)
+    except Exception as error:  # pylint: disable=broad-except
+        logger.error('Document manifest not written: %s', str(error))
+
+    faq_id = get_kendra_faq_id(kendra_index_id, resource_properties['FAQName'])
+    if faq_id is None:
+        faq_id = create_kendra_faq(kendra_index_id, resource_properties)
+    else:
+        logger.info('Reusing FAQId: %s', faq_id)
+    helper.Data['FAQId'] = faq_id
 
-    helper.Data['SyncExecutionId'] = start_data_source_sync_job(kendra_index_id, data_source_id)
-
-    helper.Data['FAQId'] = create_kendra_faq(kendra_index_id, event['ResourceProperties'])
+    capacity_units = get_capacity_units(resource_properties)
+    if capacity_units:
+        update_kendra_index_capacity(kendra_index_id, capacity_units)
 
-    return kendra_index_id
+    return kendra_index_id + '/readiness'
 
 
 def lambda_handler(event, context):
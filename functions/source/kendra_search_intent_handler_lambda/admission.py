@@ -0,0 +1,179 @@
+"""
+Admission control for Kendra queries issued by this container.
+A token bucket caps the query rate, and throttling reported by Kendra closes admission for a
+cool-down period that doubles on repeated throttles. Rejected requests are served by cheaper
+tiers (cached or locally indexed answers) instead of failing.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Kendra error codes signalling that the index is over its query capacity
+THROTTLE_ERROR_CODES = ('ThrottlingException', 'ServiceQuotaExceededException')
+
+# Tiers serving a fallback request, from cheapest to most expensive
+TIER_STATIC = 'static'
+TIER_CACHE = 'cache'
+TIER_LEX = 'lex'
+TIER_KENDRA = 'kendra'
+TIER_DEGRADED = 'degraded'
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate` tokens per second, holding at most `burst`.
+    """
+
+    def __init__(self, rate, burst, clock=time.time):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.clock = clock
+        self.updated = clock()
+
+    def try_acquire(self, tokens=1):
+        """
+        Takes tokens if enough are available.
+        :param tokens: Tokens needed
+        :return: True if the tokens were taken
+        """
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + max(now - self.updated, 0) * self.rate)
+        self.updated = max(now, self.updated)
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+
+class AdmissionController:
+    """
+    Decides whether Kendra may be queried and counts which tier served each request.
+    """
+
+    def __init__(self, rate, burst, cooldown, max_cooldown, clock=time.time):
+        self.bucket = TokenBucket(rate, burst, clock)
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self.current_cooldown = cooldown
+        self.closed_until = 0.0
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def admit(self, queries=1):
+        """
+        :param queries: Number of Kendra queries the request would issue
+        :return: True if the request may query Kendra
+        """
+        with self._lock:
+            if self.clock() < self.closed_until:
+                return False
+            return self.bucket.try_acquire(queries)
+
+    def report_throttle(self):
+        """
+        Closes admission for the current cool-down and doubles the next one.
+        :return: None
+        """
+        with self._lock:
+            self.closed_until = self.clock() + self.current_cooldown
+            logger.warning('<<help_desk_bot>> Kendra throttled, admission closed for %.1fs',
+                           self.current_cooldown)
+            self.current_cooldown = min(self.current_cooldown * 2, self.max_cooldown)
+
+    def report_success(self):
+        """
+        Resets the cool-down after a successful query.
+        :return: None
+        """
+        with self._lock:
+            self.current_cooldown = self.cooldown
+
+    def count(self, tier):
+        """
+        Counts a request served by a tier.
+        :param tier: One of the TIER_* constants
+        :return: None
+        """
+        with self._lock:
+            self.counters[tier] = self.counters.get(tier, 0) + 1
+
+    def get_counters(self):
+        """
+        :return: Map of tier to number of requests it served in this container
+        """
+        with self._lock:
+            return dict(self.counters)
+
+
+class AnswerCache:
+    """
+    Bounded LRU cache of rendered answers keyed by normalised transcript, with a TTL.
+    Each answer can carry the versions of the documents it was rendered from, so that it is
+    invalidated when one of them changes.
+    """
+
+    def __init__(self, max_entries, ttl, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(transcript):
+        """
+        :param transcript: User input transcript
+        :return: Cache key of the transcript
+        """
+        return ' '.join(transcript.lower().split())
+
+    def get(self, transcript, is_current=None):
+        """
+        :param transcript: User input transcript
+        :param is_current: Function telling from the versions stored with the answer whether
+                           its documents are unchanged
+        :return: Cached answer, or None if absent, expired or outdated
+        """
+        key = self.key(transcript)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if self.clock() - entry[0] > self.ttl or \
+                    (is_current is not None and not is_current(entry[2])):
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, transcript, answer, versions=None):
+        """
+        Caches an answer, evicting the least recently used one when full.
+        :param transcript: User input transcript
+        :param answer: Rendered answer
+        :param versions: Versions of the documents the answer was rendered from
+        :return: None
+        """
+        key = self.key(transcript)
+        with self._lock:
+            self.entries[key] = (self.clock(), answer, versions)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+controller = AdmissionController(
+    rate=float(os.environ.get('KENDRA_ADMISSION_RATE', '1.0')),
+    burst=float(os.environ.get('KENDRA_ADMISSION_BURST', '5')),
+    cooldown=float(os.environ.get('KENDRA_THROTTLE_COOLDOWN', '5')),
+    max_cooldown=float(os.environ.get('KENDRA_THROTTLE_MAX_COOLDOWN', '60')))
+answer_cache = AnswerCache(
+    max_entries=int(os.environ.get('ANSWER_CACHE_SIZE', '256')),
+    ttl=float(os.environ.get('ANSWER_CACHE_TTL', '300')))
@@ -1,6 +1,18 @@
 """
 File for Slot configuration
 """
+import os
+
+WARM_UP_KEY = 'warmUp'
+
+# Confidence needed to answer a fallback transcript from the static intents' utterance index
+UTTERANCE_MATCH_THRESHOLD = float(os.environ.get('UTTERANCE_MATCH_THRESHOLD', '0.6'))
+UTTERANCE_MATCH_MARGIN = float(os.environ.get('UTTERANCE_MATCH_MARGIN', '0.1'))
+# Slightly looser match, with the same margin, used when Kendra cannot be queried; below it the
+# busy message is returned, as a wrong static answer is worse than asking again
+DEGRADED_MATCH_THRESHOLD = float(os.environ.get('DEGRADED_MATCH_THRESHOLD', '0.5'))
+BUSY_MESSAGE = 'Our document search is very busy right now. Could you please ask again in ' \
+               'a minute, or try rephrasing your question?'
 
 ORIGINAL_VALUE = 0
 TOP_RESOLUTION = 1
@@ -0,0 +1,120 @@
+"""
+Read-only view of the document manifest written by the Kendra custom resource at sync time.
+The manifest is a sqlite table mapping Kendra document IDs (s3://<bucket>/<key>) to the S3 key,
+title, size and last-modified time of each document. It is downloaded from the documents
+bucket at init and held in a dict for O(1) lookups. Its ETag is checked again at most every
+DOCUMENT_MANIFEST_TTL seconds and the manifest reloaded when it changed.
+
+DOCUMENT_MANIFEST_KEY is the key of the manifest in KENDRA_DATA_BUCKET; empty disables it, and
+links are then derived from the document ID.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+MANIFEST_KEY = os.environ.get('DOCUMENT_MANIFEST_KEY', '')
+MANIFEST_TTL = float(os.environ.get('DOCUMENT_MANIFEST_TTL', '300'))
+MANIFEST_PATH = '/tmp/document_manifest.sqlite'
+
+_lock = threading.Lock()
+_state = {'documents': {}, 'etag': None, 'checked': 0.0, 's3_client': None, 'bucket': None}
+
+
+def read_manifest(path):
+    """
+    Reads a manifest file without modifying it.
+    :param path: Path of the sqlite file
+    :return: Map of document ID to document entry
+    """
+    connection = sqlite3.connect('file:' + path + '?mode=ro', uri=True)
+    try:
+        rows = connection.execute('SELECT document_id, s3_key, title, size, last_modified '
+                                  'FROM documents')
+        return {document_id: {'key': key, 'title': title, 'size': size,
+                              'lastModified': last_modified}
+                for document_id, key, title, size, last_modified in rows}
+    finally:
+        connection.close()
+
+
+def _download(etag=None):
+    """
+    Downloads and reads the manifest if its ETag differs from etag.
+    :param etag: ETag of the loaded manifest
+    :return: None
+    """
+    s3_client, bucket_name = _state['s3_client'], _state['bucket']
+    current_etag = s3_client.head_object(Bucket=bucket_name, Key=MANIFEST_KEY)['ETag']
+    if current_etag != etag:
+        body = s3_client.get_object(Bucket=bucket_name, Key=MANIFEST_KEY)['Body'].read()
+        with open(MANIFEST_PATH, 'wb') as manifest_file:
+            manifest_file.write(body)
+        documents = read_manifest(MANIFEST_PATH)
+        with _lock:
+            _state['documents'] = documents
+            _state['etag'] = current_etag
+        logger.info('<<help_desk_bot>> loaded manifest of %d documents', len(documents))
+
+
+def load(s3_client, bucket_name):
+    """
+    Loads the manifest at init. A missing or unreadable manifest leaves it empty.
+    :param s3_client: S3 client
+    :param bucket_name: Documents bucket
+    :return: None
+    """
+    if not MANIFEST_KEY:
+        return
+    _state['s3_client'] = s3_client
+    _state['bucket'] = bucket_name
+    _state['checked'] = time.time()
+    try:
+        _download()
+    except Exception as error:  # pylint: disable=broad-except
+        logger.warning('<<help_desk_bot>> document manifest not loaded: %s', str(error))
+
+
+def refresh():
+    """
+    Reloads the manifest if it changed, checking at most every MANIFEST_TTL seconds.
+    :return: None
+    """
+    if not MANIFEST_KEY or _state['s3_client'] is None or \
+            time.time() - _state['checked'] < MANIFEST_TTL:
+        return
+    _state['checked'] = time.time()
+    try:
+        _download(_state['etag'])
+    except Exception as error:  # pylint: disable=broad-except
+        logger.warning('<<help_desk_bot>> document manifest not refreshed: %s', str(error))
+
+
+def lookup(document_id):
+    """
+    :param document_id: Kendra document ID
+    :return: Document entry (key, title, size, lastModified), or None if not in the manifest
+    """
+    return _state['documents'].get(document_id)
+
+
+def get_versions(document_ids):
+    """
+    :param document_ids: Kendra document IDs
+    :return: Map of document ID to last-modified time (None if not in the manifest)
+    """
+    return {document_id: (lookup(document_id) or {}).get('lastModified')
+            for document_id in document_ids}
+
+
+def is_current(versions):
+    """
+    Checks that the documents an answer was rendered from are unchanged.
+    :param versions: Map of document ID to last-modified time, from get_versions
+    :return: True if no document changed since
+    """
+    return versions is None or get_versions(versions) == versions
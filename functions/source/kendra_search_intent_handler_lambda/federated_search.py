@@ -0,0 +1,206 @@
+"""
+Fan-out of a transcript across several Kendra indexes with a score based merge.
+Indexes are configured in KENDRA_FEDERATED_INDEXES as a comma separated list of
+<index id>[=<timeout in seconds>]. Without it only the response Lex passes in is used.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent import futures
+import boto3
+from botocore.client import Config
+from botocore.exceptions import ClientError
+import admission
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+DEFAULT_TIMEOUT = float(os.environ.get('KENDRA_QUERY_TIMEOUT', '2.0'))
+
+# Merge order: confidence of the result first, then how direct an answer its type is
+CONFIDENCE_RANK = {'VERY_HIGH': 4, 'HIGH': 3, 'MEDIUM': 2, 'LOW': 1}
+RESULT_TYPE_RANK = {'ANSWER': 3, 'QUESTION_ANSWER': 2, 'DOCUMENT': 1}
+
+
+def parse_index_config(value, default_timeout):
+    """
+    Parses the federated index configuration.
+    :param value: Comma separated list of <index id>[=<timeout in seconds>]
+    :param default_timeout: Timeout of indexes without an explicit one
+    :return: List of (index id, timeout)
+    """
+    indexes = []
+    for entry in value.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        index_id, _, timeout = entry.partition('=')
+        indexes.append((index_id.strip(), float(timeout) if timeout else default_timeout))
+    return indexes
+
+
+INDEXES = parse_index_config(os.environ.get('KENDRA_FEDERATED_INDEXES', ''), DEFAULT_TIMEOUT)
+
+kendra_client = boto3.client('kendra', config=Config(
+    connect_timeout=max([DEFAULT_TIMEOUT] + [timeout for _, timeout in INDEXES]),
+    read_timeout=max([DEFAULT_TIMEOUT] + [timeout for _, timeout in INDEXES]),
+    retries={'max_attempts': 1}))
+_executor = futures.ThreadPoolExecutor(max_workers=max(2 * len(INDEXES), 1))
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def is_enabled():
+    """
+    :return: True if federated indexes are configured
+    """
+    return bool(INDEXES)
+
+
+def to_lex_format(value):
+    """
+    Converts a Kendra API response to the camelCase keys Lex uses for kendraResponse,
+    so that the same renderers apply to both.
+    :param value: Kendra query response or part of it
+    :return: Converted value
+    """
+    if isinstance(value, dict):
+        return {key[:1].lower() + key[1:]: to_lex_format(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_lex_format(item) for item in value]
+    return value
+
+
+def record(index_id, outcome, latency=None, won=False):
+    """
+    Updates the per-index statistics of this container.
+    :param index_id: Kendra Index Id
+    :param outcome: 'ok', 'timeout', 'throttled' or 'error'
+    :param latency: Query latency in seconds, if the query completed
+    :param won: True if the index supplied the chosen result
+    :return: None
+    """
+    with _stats_lock:
+        stats = _stats.setdefault(index_id, {'queries': 0, 'ok': 0, 'timeout': 0,
+                                             'throttled': 0, 'error': 0, 'wins': 0,
+                                             'latencyMsTotal': 0.0, 'latencyMsMax': 0.0})
+        stats['queries'] += 1
+        stats[outcome] += 1
+        if won:
+            stats['wins'] += 1
+        if latency is not None:
+            stats['latencyMsTotal'] += latency * 1000
+            stats['latencyMsMax'] = max(stats['latencyMsMax'], latency * 1000)
+
+
+def get_stats():
+    """
+    Gets the per-index latency and contribution statistics of this container.
+    :return: Map of index id to statistics
+    """
+    with _stats_lock:
+        return {index_id: dict(stats) for index_id, stats in _stats.items()}
+
+
+def query_index(index_id, query_text):
+    """
+    Queries one Kendra index.
+    :param index_id: Kendra Index Id
+    :param query_text: Transcript
+    :return: Tuple of (response in Lex format, latency in seconds)
+    """
+    started = time.time()
+    response = kendra_client.query(IndexId=index_id, QueryText=query_text)
+    return to_lex_format(response), time.time() - started
+
+
+def result_rank(item):
+    """
+    :param item: Kendra result item (Lex format)
+    :return: Sort key of a result item, higher is better
+    """
+    confidence = item.get('scoreAttributes', {}).get('scoreConfidence')
+    return CONFIDENCE_RANK.get(confidence, 0), RESULT_TYPE_RANK.get(item.get('type'), 0)
+
+
+def merge(responses):
+    """
+    Picks the best result item across index responses.
+    Ties go to the index listed first.
+    :param responses: List of (index id, response in Lex format)
+    :return: Tuple of (index id, result item), or (None, None) without results
+    """
+    best = (None, None)
+    best_rank = None
+    for index_id, response in responses:
+        for item in response.get('resultItems', []):
+            rank = result_rank(item)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = (index_id, item), rank
+    return best
+
+
+def query_count(lex_index_id=None):
+    """
+    :param lex_index_id: Index Id of the Kendra Search Intent
+    :return: Number of Kendra queries a search issues
+    """
+    return len([index_id for index_id, _ in INDEXES if index_id != lex_index_id])
+
+
+def search(query_text, lex_response=None, lex_index_id=None):
+    """
+    Queries the federated indexes concurrently and merges their results.
+    Each index gets its own deadline; indexes missing it are left out of the merge.
+    The index Lex already queried (lex_index_id) is not queried again, its response is reused.
+    :param query_text: Transcript
+    :param lex_response: kendraResponse passed in by Lex
+    :param lex_index_id: Index Id of the Kendra Search Intent
+    :return: Tuple of (Kendra response (Lex format) holding the best result item,
+             True if any index throttled the query)
+    """
+    responses = []
+    if lex_response is not None and lex_index_id:
+        responses.append((lex_index_id, lex_response))
+
+    started = time.time()
+    pending = [(index_id, timeout, _executor.submit(query_index, index_id, query_text))
+               for index_id, timeout in INDEXES if index_id != lex_index_id]
+    outcomes = {}
+    for index_id, timeout, future in pending:
+        try:
+            response, latency = future.result(timeout=max(started + timeout - time.time(), 0))
+        except futures.TimeoutError:
+            outcomes[index_id] = ('timeout', None)
+            continue
+        except ClientError as error:
+            if error.response.get('Error', {}).get('Code') in admission.THROTTLE_ERROR_CODES:
+                outcomes[index_id] = ('throttled', None)
+            else:
+                logger.error('<<help_desk_bot>> query of Kendra index %s failed: %s',
+                             index_id, str(error))
+                outcomes[index_id] = ('error', None)
+            continue
+        except Exception as error:  # pylint: disable=broad-except
+            logger.error('<<help_desk_bot>> query of Kendra index %s failed: %s',
+                         index_id, str(error))
+            outcomes[index_id] = ('error', None)
+            continue
+        outcomes[index_id] = ('ok', latency)
+        responses.append((index_id, response))
+
+    winner, item = merge(responses)
+    for index_id, (outcome, latency) in outcomes.items():
+        record(index_id, outcome, latency, won=index_id == winner)
+    if lex_response is not None and lex_index_id:
+        record(lex_index_id, 'ok', won=lex_index_id == winner)
+    logger.info('<<help_desk_bot>> federated search: %s', json.dumps(
+        {'winner': winner, 'indexes': {index_id: {'outcome': outcome, 'latency': latency}
+                                       for index_id, (outcome, latency) in outcomes.items()}}))
+
+    throttled = any(outcome == 'throttled' for outcome, _ in outcomes.values())
+    if item is None:
+        return {'resultItems': []}, throttled
+    return {'resultItems': [item]}, throttled
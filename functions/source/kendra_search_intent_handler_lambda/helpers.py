@@ -5,15 +5,27 @@ import logging
 import json
 import pprint
 import os
+import time
 import boto3
 from botocore.exceptions import ClientError
 from botocore.client import Config
 import config as help_desk_config
+import document_manifest
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 kendra_client = boto3.client('kendra')
+s3_client = boto3.client('s3', os.environ['AWS_REGION'], config=Config(signature_version='s3v4'))
+
+WARM_UP_RESPONSE = {
+    'resultItems': [{
+        'type': 'DOCUMENT',
+        'documentId': 's3://warm-up/warm-up.pdf',
+        'documentTitle': {'text': 'Warm-up'},
+        'documentExcerpt': {'text': 'Warm-up'}
+    }]
+}
 
 
 def get_slot_values(slot_values, intent_request):
@@ -173,8 +185,6 @@ def create_presigned_url(bucket_name, object_name, expiration=604800):
     :param expiration: Time after which link will expire
     :return: Signed URL
     """
-    s3_client = boto3.client('s3', os.environ['AWS_REGION'],
-                             config=Config(signature_version='s3v4'))
     try:
         response_s3 = s3_client.generate_presigned_url('get_object',
                                                        Params={'Bucket': bucket_name,
@@ -186,6 +196,34 @@ def create_presigned_url(bucket_name, object_name, expiration=604800):
     return response_s3
 
 
+def format_size(size):
+    """
+    :param size: Size in bytes
+    :return: Human readable size
+    """
+    for unit in ('bytes', 'KB', 'MB'):
+        if size < 1024:
+            return ('%d %s' if unit == 'bytes' else '%.1f %s') % (size, unit)
+        size /= 1024.0
+    return '%.1f GB' % size
+
+
+def get_document_link(document_id):
+    """
+    Generate the link to a document, with its size and last-modified date when the document
+    manifest has them. Without a manifest entry the S3 key is the last part of the document ID.
+    :param document_id: Kendra document ID
+    :return: Presigned URL, followed by the document details if known
+    """
+    document = document_manifest.lookup(document_id)
+    if document is None:
+        document_key = document_id[(document_id.rindex("/") + 1):]
+        return create_presigned_url(os.environ['KENDRA_DATA_BUCKET'], document_key)
+    url = create_presigned_url(os.environ['KENDRA_DATA_BUCKET'], document['key'])
+    return '%s (%s, updated %s)' % (url, format_size(document['size']), time.strftime(
+        '%Y-%m-%d', time.gmtime(document['lastModified'])))
+
+
 def question_result_type(response):
     """
     Generate the answer text for question result type.
@@ -214,10 +252,8 @@ def answer_result_type(response):
         document_id = response['resultItems'][0]['documentId']
         document_text = response['resultItems'][0]['additionalAttributes'][0][
             'value']['textWithHighlightsValue']['text']
-        pos = document_id.rindex("/")
-        document_key = document_id[(pos + 1):]
-        logger.info(document_key)
-        document_url = create_presigned_url(os.environ['KENDRA_DATA_BUCKET'], document_key)
+        logger.info(document_id)
+        document_url = get_document_link(document_id)
         if response['resultItems'][0]['additionalAttributes'][0][
                 'value']['textWithHighlightsValue']['highlights'][0]['topAnswer']:
             begin = int(response['resultItems'][0]['additionalAttributes'][0][
@@ -250,11 +286,9 @@ def document_result_type(response):
     :return: Answer text
     """
     document_id = response['resultItems'][0]['documentId']
-    pos = document_id.rindex("/")
-    document_key = document_id[(pos + 1):]
-    logger.info(document_key)
+    logger.info(document_id)
 
-    url = create_presigned_url(os.environ['KENDRA_DATA_BUCKET'], document_key)
+    url = get_document_link(document_id)
     # logger.info(response['ResultItems'][0]['DocumentTitle']['Text'])
     logger.info(url)
     document_list = "On searching the Enterprise repository, I have found" \
@@ -293,3 +327,17 @@ def get_kendra_answer(intent_request):
         answer_text = document_result_type(intent_request)
 
     return answer_text
+
+
+def prime():
+    """
+    Does the expensive one-time work of the container, so that it happens during the init
+    phase (and ahead of traffic with provisioned concurrency) instead of on the first request.
+    Renders a dummy Kendra response to load the code paths and sign a URL once.
+    Failures are logged and do not fail the init phase.
+    :return: None
+    """
+    try:
+        get_kendra_answer(WARM_UP_RESPONSE)
+    except Exception as error:  # pylint: disable=broad-except
+        logger.warning('<<help_desk_bot>> priming failed: %s', str(error))
@@ -4,13 +4,32 @@ Generates Lex Bot response by triggering intent handler according to the intent
 
 import logging
 import json
+import os
+import time
 import helpers
 import config
+import utterance_index
+import federated_search
+import admission
+import telemetry
+import profiling
+import document_manifest
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
+def is_warm_up_event(event):
+    """
+    Checks whether the event is a warm-up ping rather than a Lex request.
+    Warm-up pings carry the config.WARM_UP_KEY key or come from a scheduled EventBridge rule.
+    :param event: Event body
+    :return: True for warm-up pings, False otherwise
+    """
+    return bool(event.get(config.WARM_UP_KEY)) or event.get('source') == 'aws.events'
+
+
+@profiling.profiled
 def lambda_handler(event, _):
     """
     Lambda function handler. Triggers applicable intent handler and returns Lex bot response.
@@ -18,6 +37,11 @@ def lambda_handler(event, _):
     :param _: Context (not used)
     :return: Lex bot response
     """
+    if is_warm_up_event(event):
+        return {config.WARM_UP_KEY: True, 'kendraIndexStats': federated_search.get_stats(),
+                'tierCounts': admission.controller.get_counters(),
+                'telemetry': telemetry.buffer.get_counters()}
+
     logger.info('<help_desk_bot>> Lex event info = %s', json.dumps(event))
 
     session_attributes = event.get('sessionAttributes', None)
@@ -48,6 +72,47 @@ def lambda_handler(event, _):
                          {'contentType': 'CustomPayload', 'content': response_string})
 
 
+def get_kendra_result(query_string, lex_response):
+    """
+    Gets the Kendra response to render through the most complete tier admission control allows:
+    a federated search, else the response Lex passed in, else none (degraded).
+    :param query_string: Transcript
+    :param lex_response: kendraResponse passed in by Lex
+    :return: Tuple of (Kendra response or None, tier)
+    """
+    lex_index_id = os.environ.get('KENDRA_INDEX')
+    if federated_search.is_enabled() and \
+            admission.controller.admit(federated_search.query_count(lex_index_id)):
+        kendra_result, throttled = federated_search.search(query_string, lex_response,
+                                                           lex_index_id)
+        if not throttled:
+            admission.controller.report_success()
+            return kendra_result, admission.TIER_KENDRA
+        admission.controller.report_throttle()
+        if not kendra_result['resultItems']:
+            return None, admission.TIER_DEGRADED
+        return kendra_result, admission.TIER_KENDRA
+    if lex_response is None:
+        # Lex passes no response when its own Kendra query failed, typically when throttled
+        admission.controller.report_throttle()
+        return None, admission.TIER_DEGRADED
+    return lex_response, admission.TIER_LEX
+
+
+def get_degraded_answer(query_string):
+    """
+    Answers without Kendra: the closest static intent on a slightly looser match, else a busy
+    message.
+    :param query_string: Transcript
+    :return: Answer text
+    """
+    static_answer = utterance_index.match(query_string, config.DEGRADED_MATCH_THRESHOLD,
+                                          config.UTTERANCE_MATCH_MARGIN)
+    if static_answer is not None:
+        return static_answer[1]
+    return config.BUSY_MESSAGE
+
+
 def kendra_search_intent_handler(intent_request, session_attributes):
     """
     Fallback intent handler. Generates response by querying Kendra index.
@@ -71,22 +136,69 @@ def kendra_search_intent_handler(intent_request, session_attributes):
     if intent_request.get('inputTranscript', None) is not None:
         query_string += intent_request['inputTranscript']
 
+    started = time.time()
+    answer, tier, kendra_result = answer_transcript(query_string,
+                                                    intent_request.get('kendraResponse'))
+    admission.controller.count(tier)
+    telemetry.buffer.record({
+        'timestamp': started,
+        'transcript': query_string,
+        'tier': tier,
+        'resultTypes': [item.get('type') for item in
+                        (kendra_result or {}).get('resultItems') or []],
+        'answer': answer,
+        'latencyMs': round((time.time() - started) * 1000, 1)
+    })
+    logger.debug(
+        '<<help_desk_bot>> "kendra_search_intent_handler(): kendra_response = %s',
+        str(answer))
+    return helpers.close(session_attributes, 'Fulfilled',
+                         {'contentType': 'CustomPayload', 'content': answer})
+
+
+def answer_transcript(query_string, lex_response):
+    """
+    Answers a fallback transcript through the cheapest tier able to: static intents, cached
+    answers, then Kendra.
+    :param query_string: Transcript
+    :param lex_response: kendraResponse passed in by Lex
+    :return: Tuple of (answer text, tier, Kendra response or None)
+    """
+    static_answer = utterance_index.match(query_string, config.UTTERANCE_MATCH_THRESHOLD,
+                                          config.UTTERANCE_MATCH_MARGIN)
+    if static_answer is not None:
+        logger.info('<<help_desk_bot>> kendra_search_intent_handler(): answered by intent %s '
+                    '(score %.2f)', static_answer[0], static_answer[2])
+        return static_answer[1], admission.TIER_STATIC, None
+
+    document_manifest.refresh()
+    cached_answer = admission.answer_cache.get(query_string, document_manifest.is_current)
+    if cached_answer is not None:
+        return cached_answer, admission.TIER_CACHE, None
+
     logger.debug(
         '<<help_desk_bot>> kendra_search_intent_handler(): calling get_kendra_answer(query="%s")',
         query_string)
 
-    kendra_response = helpers.get_kendra_answer(intent_request['kendraResponse'])
+    kendra_result, tier = get_kendra_result(query_string, lex_response)
+    if tier == admission.TIER_DEGRADED:
+        return get_degraded_answer(query_string), tier, None
+
+    kendra_response = helpers.get_kendra_answer(kendra_result)
     if kendra_response is None:
         response = "Sorry, I was not able to understand your question. Could you please repeat?"
-        return helpers.close(session_attributes,
-                             'Fulfilled', {'contentType': 'CustomPayload', 'content': response})
-    logger.debug(
-        '<<help_desk_bot>> "kendra_search_intent_handler(): kendra_response = %s',
-        str(kendra_response))
-    return helpers.close(session_attributes, 'Fulfilled',
-                         {'contentType': 'CustomPayload', 'content': kendra_response})
+        return response, tier, kendra_result
+    if kendra_result.get('resultItems'):
+        admission.answer_cache.put(query_string, kendra_response, document_manifest.get_versions(
+            [item['documentId'] for item in kendra_result['resultItems'] if 'documentId' in item]))
+    return kendra_response, tier, kendra_result
 
 
 HANDLERS = {
     'Kendra_Search_Intent': {'handler': kendra_search_intent_handler}
 }
+
+
+utterance_index.load()
+document_manifest.load(helpers.s3_client, os.environ.get('KENDRA_DATA_BUCKET'))
+helpers.prime()
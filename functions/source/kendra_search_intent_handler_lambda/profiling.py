@@ -0,0 +1,139 @@
+"""
+On-demand profiling of lambda_handler invocations.
+A sampled invocation runs under cProfile and tracemalloc, and a compact artifact with its top
+frames by cumulative time and its top allocation sites is handed to the sink by a background
+thread (see telemetry.TelemetryBuffer). Unsampled invocations only pay for one flag check.
+
+PROFILE_SAMPLE_RATE is the fraction of invocations profiled (0 disables sampling).
+With PROFILE_SESSION_TRIGGER=true, a Lex session attribute profile=true also profiles the
+invocation. PROFILE_SINK takes the same locations as TELEMETRY_SINK and defaults to
+file:///tmp/profiles.
+"""
+import cProfile
+import functools
+import logging
+import os
+import pstats
+import random
+import time
+import tracemalloc
+import telemetry
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+SESSION_TRIGGER = os.environ.get('PROFILE_SESSION_TRIGGER', 'false').lower() == 'true'
+SESSION_ATTRIBUTE = 'profile'
+TOP_N = int(os.environ.get('PROFILE_TOP_N', '20'))
+TRACEMALLOC_FRAMES = int(os.environ.get('PROFILE_TRACEMALLOC_FRAMES', '1'))
+
+ENABLED = SAMPLE_RATE > 0 or SESSION_TRIGGER
+
+
+def should_profile(event):
+    """
+    :param event: Event body
+    :return: True if the invocation is sampled or requests profiling through its session
+    """
+    if SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE:
+        return True
+    if SESSION_TRIGGER:
+        session_attributes = event.get('sessionAttributes') or {}
+        return str(session_attributes.get(SESSION_ATTRIBUTE, '')).lower() == 'true'
+    return False
+
+
+def get_top_frames(profiler, top_n):
+    """
+    :param profiler: Disabled cProfile.Profile
+    :param top_n: Number of frames
+    :return: List of the frames with the highest cumulative time
+    """
+    stats = pstats.Stats(profiler).stats
+    frames = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:top_n]
+    return [{'frame': '%s:%d(%s)' % (os.path.basename(filename), line, name),
+             'calls': calls,
+             'totalMs': round(total_time * 1000, 3),
+             'cumulativeMs': round(cumulative_time * 1000, 3)}
+            for (filename, line, name), (_, calls, total_time, cumulative_time, _) in frames]
+
+
+def get_top_allocations(before, after, top_n):
+    """
+    :param before: tracemalloc snapshot taken before the invocation
+    :param after: tracemalloc snapshot taken after the invocation
+    :param top_n: Number of allocation sites
+    :return: List of the allocation sites that grew the most during the invocation
+    """
+    differences = after.compare_to(before, 'lineno')
+    return [{'site': '%s:%d' % (os.path.basename(difference.traceback[0].filename),
+                                difference.traceback[0].lineno),
+             'sizeKiB': round(difference.size_diff / 1024.0, 1),
+             'count': difference.count_diff}
+            for difference in differences[:top_n] if difference.size_diff > 0]
+
+
+def run_profiled(handler, event, context):
+    """
+    Runs the handler under cProfile and tracemalloc and records the profile.
+    The profile is recorded even if the handler raises.
+    :param handler: Lambda handler
+    :param event: Event body
+    :param context: Lambda context
+    :return: Handler response
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    elif hasattr(tracemalloc, 'reset_peak'):  # Python 3.9+, else the peak spans the trace
+        tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    profiler = cProfile.Profile()
+    started = time.time()
+    try:
+        profiler.enable()
+        try:
+            return handler(event, context)
+        finally:
+            profiler.disable()
+    finally:
+        wall_ms = (time.time() - started) * 1000
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if not tracing:
+            tracemalloc.stop()
+        buffer.record({
+            'timestamp': started,
+            'requestId': getattr(context, 'aws_request_id', None),
+            'intent': (event.get('currentIntent') or {}).get('name'),
+            'wallMs': round(wall_ms, 1),
+            'peakKiB': round(peak / 1024.0, 1),
+            'topFrames': get_top_frames(profiler, TOP_N),
+            'topAllocations': get_top_allocations(before, after, TOP_N)
+        })
+        logger.info('<<help_desk_bot>> profiled invocation in %.1f ms', wall_ms)
+
+
+def profiled(handler):
+    """
+    Decorator profiling the invocations of a Lambda handler selected by should_profile.
+    Returns the handler unchanged when profiling is off.
+    :param handler: Lambda handler
+    :return: Wrapped handler
+    """
+    if not ENABLED:
+        return handler
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        if not should_profile(event):
+            return handler(event, context)
+        return run_profiled(handler, event, context)
+    return wrapper
+
+
+buffer = telemetry.TelemetryBuffer(
+    telemetry.create_sink(os.environ.get('PROFILE_SINK') or 'file:///tmp/profiles')
+    if ENABLED else None,
+    max_records=1)
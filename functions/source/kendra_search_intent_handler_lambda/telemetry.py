@@ -0,0 +1,193 @@
+"""
+Non-blocking export of query/answer telemetry for offline relevance tuning.
+Records are buffered in memory as JSON lines and written as gzip batches by a background
+thread once TELEMETRY_MAX_RECORDS records or TELEMETRY_MAX_AGE seconds accumulate, so no
+request waits on the sink. The buffer is bounded; records that do not fit are dropped and
+counted.
+Note that Lambda freezes the container between invocations: a pending flush completes at the
+start of the next invocation of the container. Records still buffered when a frozen container
+is reclaimed are lost without being counted as dropped, so the drop counters under-report;
+the defaults keep at most TELEMETRY_MAX_RECORDS (100) records or TELEMETRY_MAX_AGE (15)
+seconds of records at risk.
+
+TELEMETRY_SINK selects the sink: s3://<bucket>/<prefix>, file://<directory>, or empty (off).
+"""
+import datetime
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import boto3
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+class LocalFileSink:
+    """
+    Writes each batch to a .jsonl.gz file in a local directory.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def write(self, batch):
+        """
+        :param batch: Gzip compressed JSON lines
+        :return: None
+        """
+        path = os.path.join(self.directory, '%d-%s.jsonl.gz' % (time.time() * 1000,
+                                                                uuid.uuid4().hex[:8]))
+        with open(path, 'wb') as batch_file:
+            batch_file.write(batch)
+
+
+class S3Sink:
+    """
+    Writes each batch to S3 under <prefix>/<yyyy>/<mm>/<dd>/.
+    """
+
+    def __init__(self, bucket_name, prefix, s3_client=None):
+        self.bucket_name = bucket_name
+        self.prefix = prefix.strip('/')
+        self.s3_client = s3_client or boto3.client('s3')
+
+    def write(self, batch):
+        """
+        :param batch: Gzip compressed JSON lines
+        :return: None
+        """
+        key = '/'.join(part for part in (
+            self.prefix, datetime.datetime.utcnow().strftime('%Y/%m/%d'),
+            uuid.uuid4().hex + '.jsonl.gz') if part)
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=batch,
+                                  ContentType='application/x-ndjson', ContentEncoding='gzip')
+
+
+def create_sink(location):
+    """
+    Creates the sink for a TELEMETRY_SINK location.
+    :param location: s3://<bucket>/<prefix>, file://<directory> or empty
+    :return: Sink, or None when telemetry is off
+    """
+    if location.startswith('s3://'):
+        bucket_name, _, prefix = location[len('s3://'):].partition('/')
+        return S3Sink(bucket_name, prefix)
+    if location.startswith('file://'):
+        return LocalFileSink(location[len('file://'):])
+    if location:
+        raise ValueError('Unsupported TELEMETRY_SINK: ' + location)
+    return None
+
+
+class TelemetryBuffer:
+    """
+    Bounded in-memory buffer of telemetry records flushed by a background thread.
+    :param sink: Object with a write(batch) method, or None to discard records
+    :param max_records: Records that trigger a flush
+    :param max_age: Seconds after which buffered records are flushed
+    :param max_bytes: Buffered bytes beyond which new records are dropped
+    """
+
+    def __init__(self, sink, max_records=100, max_age=15.0, max_bytes=4 * 1024 * 1024):
+        self.sink = sink
+        self.max_records = max_records
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.lines = []
+        self.buffered_bytes = 0
+        self.oldest = None
+        self.counters = {'recorded': 0, 'dropped': 0, 'flushedRecords': 0, 'flushedBatches': 0,
+                         'sinkErrors': 0}
+        self._condition = threading.Condition()
+        self._flush_requested = False
+        self._thread = None
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='telemetry-flush')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def record(self, record):
+        """
+        Buffers a record without blocking on the sink.
+        :param record: JSON serialisable dict
+        :return: None
+        """
+        if self.sink is None:
+            return
+        line = (json.dumps(record, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+        with self._condition:
+            if self.buffered_bytes + len(line) > self.max_bytes:
+                self.counters['dropped'] += 1
+                return
+            self.lines.append(line)
+            self.buffered_bytes += len(line)
+            self.counters['recorded'] += 1
+            if self.oldest is None:
+                self.oldest = time.time()
+            if len(self.lines) >= self.max_records:
+                self._flush_requested = True
+                self._condition.notify()
+        self._start()
+
+    def flush(self):
+        """
+        Requests a flush from the background thread and returns immediately.
+        :return: None
+        """
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify()
+
+    def _take_batch(self):
+        lines, self.lines = self.lines, []
+        self.buffered_bytes = 0
+        self.oldest = None
+        self._flush_requested = False
+        return lines
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self.lines or not (
+                        self._flush_requested or time.time() - self.oldest >= self.max_age):
+                    timeout = None if not self.lines else \
+                        max(self.oldest + self.max_age - time.time(), 0)
+                    self._condition.wait(timeout)
+                lines = self._take_batch()
+            self._write(lines)
+
+    def _write(self, lines):
+        try:
+            self.sink.write(gzip.compress(b''.join(lines)))
+        except Exception as error:  # pylint: disable=broad-except
+            logger.error('<<help_desk_bot>> telemetry batch of %d records lost: %s',
+                         len(lines), str(error))
+            with self._condition:
+                self.counters['sinkErrors'] += 1
+                self.counters['dropped'] += len(lines)
+            return
+        with self._condition:
+            self.counters['flushedRecords'] += len(lines)
+            self.counters['flushedBatches'] += 1
+
+    def get_counters(self):
+        """
+        :return: Recorded, dropped and flushed counters of this container
+        """
+        with self._condition:
+            return dict(self.counters, buffered=len(self.lines))
+
+
+buffer = TelemetryBuffer(
+    create_sink(os.environ.get('TELEMETRY_SINK', '')),
+    max_records=int(os.environ.get('TELEMETRY_MAX_RECORDS', '100')),
+    max_age=float(os.environ.get('TELEMETRY_MAX_AGE', '15')),
+    max_bytes=int(os.environ.get('TELEMETRY_MAX_BYTES', str(4 * 1024 * 1024))))
@@ -0,0 +1,148 @@
+"""
+N-gram index of the sample utterances of the static Lex intents.
+Transcripts that reach the Kendra fallback but paraphrase a static intent are answered with
+that intent's closing response instead of a Kendra result.
+The index is compiled from the bot export by tools/build_utterance_index.py.
+"""
+import json
+import logging
+import math
+import os
+import re
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utterance_index.json')
+INDEX_VERSION = 1
+
+_index = {'intents': [], 'doc_intents': [], 'norms': [], 'postings': {}, 'default_idf': 1.0}
+
+
+def tokenize(text):
+    """
+    Lower-cases text and splits it into alphanumeric words.
+    :param text: Utterance or transcript
+    :return: List of words
+    """
+    return re.sub(r"[^a-z0-9]+", ' ', text.lower().replace("'", '')).split()
+
+
+def ngrams(text):
+    """
+    Counts the word unigrams and bigrams of a text.
+    :param text: Utterance or transcript
+    :return: Map of n-gram to count
+    """
+    words = tokenize(text)
+    counts = {}
+    for gram in words + [a + ' ' + b for a, b in zip(words, words[1:])]:
+        counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+def build(intents):
+    """
+    Compiles the n-gram index of static intents.
+    Every sample utterance is a document weighted by TF-IDF.
+    :param intents: List of (intent name, closing response, sample utterances)
+    :return: Index as a JSON serialisable dict
+    """
+    documents = []
+    doc_intents = []
+    for intent_position, (_, _, utterances) in enumerate(intents):
+        for utterance in utterances:
+            counts = ngrams(utterance)
+            if counts:
+                documents.append(counts)
+                doc_intents.append(intent_position)
+
+    document_frequency = {}
+    for counts in documents:
+        for gram in counts:
+            document_frequency[gram] = document_frequency.get(gram, 0) + 1
+    idf = {gram: math.log((len(documents) + 1.0) / (frequency + 1.0)) + 1.0
+           for gram, frequency in document_frequency.items()}
+
+    postings = {}
+    norms = []
+    for doc_position, counts in enumerate(documents):
+        norm = 0.0
+        for gram, count in counts.items():
+            weight = count * idf[gram]
+            norm += weight * weight
+            postings.setdefault(gram, [round(idf[gram], 4), []])[1].append(
+                [doc_position, round(weight, 4)])
+        norms.append(round(math.sqrt(norm), 4))
+
+    return {
+        'version': INDEX_VERSION,
+        'intents': [{'name': name, 'answer': answer} for name, answer, _ in intents],
+        'doc_intents': doc_intents,
+        'norms': norms,
+        'postings': postings,
+        'default_idf': round(math.log(len(documents) + 1.0) + 1.0, 4)
+    }
+
+
+def load(path=INDEX_FILE):
+    """
+    Loads the index packaged with the function. A missing or outdated index disables matching.
+    :param path: Path of the index file
+    :return: None
+    """
+    global _index  # pylint: disable=global-statement
+    try:
+        with open(path) as index_file:
+            index = json.load(index_file)
+    except (IOError, OSError, ValueError) as error:
+        logger.warning('<<help_desk_bot>> utterance index not loaded: %s', str(error))
+        return
+    if index.get('version') != INDEX_VERSION:
+        logger.warning('<<help_desk_bot>> utterance index version %s not supported',
+                       index.get('version'))
+        return
+    _index = index
+
+
+def match(transcript, threshold, margin):
+    """
+    Finds the static intent whose sample utterances best match a transcript.
+    Scores are the cosine similarity with the closest sample utterance of each intent.
+    :param transcript: User input transcript
+    :param threshold: Minimum score of a confident match
+    :param margin: Minimum lead of the best intent over the runner-up
+    :return: Tuple of (intent name, closing response, score), or None without a confident match
+    """
+    counts = ngrams(transcript or '')
+    if not counts or not _index['norms']:
+        return None
+
+    postings = _index['postings']
+    query_norm = 0.0
+    dot_products = {}
+    for gram, count in counts.items():
+        posting = postings.get(gram)
+        weight = count * (posting[0] if posting else _index['default_idf'])
+        query_norm += weight * weight
+        if posting:
+            for doc_position, doc_weight in posting[1]:
+                dot_products[doc_position] = dot_products.get(doc_position, 0.0) + \
+                    weight * doc_weight
+    query_norm = math.sqrt(query_norm)
+
+    intent_scores = {}
+    for doc_position, dot_product in dot_products.items():
+        score = dot_product / (query_norm * _index['norms'][doc_position])
+        intent_position = _index['doc_intents'][doc_position]
+        intent_scores[intent_position] = max(score, intent_scores.get(intent_position, 0.0))
+    if not intent_scores:
+        return None
+
+    ranked = sorted(intent_scores.items(), key=lambda item: item[1], reverse=True)
+    best_position, best_score = ranked[0]
+    runner_up_score = ranked[1][1] if len(ranked) > 1 else 0.0
+    if best_score < threshold or best_score - runner_up_score < margin:
+        return None
+    intent = _index['intents'][best_position]
+    return intent['name'], intent['answer'], best_score
@@ -8,6 +8,11 @@ import os
 import logging
 import json
 import time
+import copy
+import hashlib
+import io
+import zipfile
+from concurrent import futures
 import boto3
 from botocore import exceptions as botocore_exceptions
 from boto3 import exceptions as boto3_exceptions
@@ -19,8 +24,17 @@ helper = CfnResource(json_logging=False, log_level='DEBUG',
 
 try:
     lex_client = boto3.client('lex-models', os.environ['AWS_REGION'])
+    kendra_client = boto3.client('kendra', os.environ['AWS_REGION'])
     s3_resource = boto3.resource('s3')
     SLEEP_TIME = 10
+    PLAN_CACHE_DIR = '/tmp/lex_bot_plans'
+    PLAN_CACHE_MAX_BYTES = 20 * 1024 * 1024
+    TEARDOWN_WORKERS = 8
+    TEARDOWN_MAX_ATTEMPTS = 8
+    IMPORT_POLL_INTERVAL = 2
+    INTENT_VERSION_WORKERS = 8
+    IMPORT_TIMEOUT = 300
+    IMPORT_METADATA = {'schemaVersion': '1.0', 'importType': 'LEX', 'importFormat': 'JSON'}
 except (botocore_exceptions.BotoCoreError, botocore_exceptions.ClientError,
         boto3_exceptions.Boto3Error) as exception:
     helper.init_failure(exception)
@@ -50,24 +64,104 @@ def read_json_file_from_s3(bucket_name, object_key):
     return json.loads(lex_json_obj.get()["Body"].read().decode('utf-8'))
 
 
-def create_lex_intents(fulfillment_lambda, intents, kendra_search_role_arn, kendra_index_id, account_id, slot_type_version):
+def get_s3_object_etag(bucket_name, object_key):
     """
-    Creates Lex intents.
-    :param fulfillment_lambda: ARN of fulfillment Lambda
+    Gets the ETag of an S3 object without downloading its body.
+    :param bucket_name: S3 Bucket Name
+    :param object_key: S3 Object Key
+    :return: ETag of the object
+    """
+    return s3_resource.Object(bucket_name, object_key).e_tag
+
+
+def get_plan_cache_key(etag, resource_properties):
+    """
+    Builds the cache key of a bot plan from the bot export ETag and the resource properties.
+    ServiceToken is left out as it does not affect the plan.
+    :param etag: ETag of the bot export in S3
+    :param resource_properties: Dictionary of resources properties
+    :return: Hex digest identifying the plan
+    """
+    key_properties = {key: value for key, value in resource_properties.items()
+                      if key != 'ServiceToken'}
+    key_source = json.dumps({'ETag': etag, 'ResourceProperties': key_properties},
+                            sort_keys=True)
+    return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+
+def read_cached_plan(cache_key):
+    """
+    Reads a compiled bot plan from the /tmp cache.
+    :param cache_key: Cache key of the plan
+    :return: Plan or None if it is not cached
+    """
+    plan_path = os.path.join(PLAN_CACHE_DIR, cache_key + '.json')
+    try:
+        with open(plan_path) as plan_file:
+            plan = json.load(plan_file)
+    except (IOError, OSError, ValueError):
+        return None
+    os.utime(plan_path, None)  # Keep recently used plans out of eviction
+    return plan
+
+
+def write_cached_plan(cache_key, plan):
+    """
+    Writes a compiled bot plan to the /tmp cache and evicts least recently used plans
+    once the cache grows past PLAN_CACHE_MAX_BYTES.
+    Cache write failures are logged and ignored.
+    :param cache_key: Cache key of the plan
+    :param plan: Compiled bot plan
+    :return: None
+    """
+    plan_path = os.path.join(PLAN_CACHE_DIR, cache_key + '.json')
+    try:
+        if not os.path.isdir(PLAN_CACHE_DIR):
+            os.makedirs(PLAN_CACHE_DIR)
+        temp_path = plan_path + '.tmp'
+        with open(temp_path, 'w') as plan_file:
+            json.dump(plan, plan_file)
+        os.replace(temp_path, plan_path)
+        evict_cached_plans(keep=plan_path)
+    except (IOError, OSError) as error:
+        logger.warning("Could not cache bot plan %s: %s", cache_key, str(error))
+
+
+def evict_cached_plans(keep=None):
+    """
+    Removes least recently used plans until the cache fits in PLAN_CACHE_MAX_BYTES.
+    :param keep: Path of a plan which must not be evicted
+    :return: None
+    """
+    entries = []
+    for file_name in os.listdir(PLAN_CACHE_DIR):
+        path = os.path.join(PLAN_CACHE_DIR, file_name)
+        stat = os.stat(path)
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_size <= PLAN_CACHE_MAX_BYTES:
+            break
+        if path == keep:
+            continue
+        os.remove(path)
+        total_size -= size
+        logger.info("Evicted cached bot plan %s", path)
+
+
+def patch_lex_intents(intents, fulfillment_lambda, kendra_search_role_arn, kendra_index_id, account_id):
+    """
+    Patches Lex intents with the fulfillment Lambda and Kendra index of this stack.
+    Built-in intents are dropped as they cannot be put.
     :param intents: List of Lex intents
+    :param fulfillment_lambda: ARN of fulfillment Lambda
     :param kendra_search_role_arn: ARN of role created for creating custom Lex bot
     :param kendra_index_id: Kendra Index ID
     :param account_id: AWS Account ID
-    :param slot_type_version: Map of Slot type versions.
-    :return: List of intents (Name and Version)
+    :return: List of patched intents
     """
-    intent_list = []
+    patched_intents = []
     for intent in intents:
-        if 'slots' in intent:
-            for slot in intent['slots']:
-                if 'slotType' in slot and slot['slotType'] in slot_type_version:
-                    slot['slotTypeVersion'] = slot_type_version[slot['slotType']]
-
         if intent['name'].startswith('AMAZON.'):
             continue
         if 'parentIntentSignature' in intent and intent['parentIntentSignature'] == 'AMAZON.KendraSearchIntent':
@@ -76,6 +170,106 @@ def create_lex_intents(fulfillment_lambda, intents, kendra_search_role_arn, kend
         intent.pop('version', None)
         if intent['fulfillmentActivity']['type'] == 'CodeHook':
             intent['fulfillmentActivity']['codeHook']['uri'] = fulfillment_lambda
+        patched_intents.append(intent)
+    return patched_intents
+
+
+def compile_bot_plan(lex_bot, resource_properties):
+    """
+    Compiles the provisioning plan of a Lex bot from its exported definition.
+    :param lex_bot: Bot description ('resource' of the bot export)
+    :param resource_properties: Dictionary of resources properties
+    :return: Plan with slot types, patched intents and bot payload
+    """
+    slot_types = lex_bot.pop('slotTypes', [])
+    for slot_type in slot_types:
+        slot_type.pop('version', None)
+    intents = patch_lex_intents(lex_bot.pop('intents', []),
+                                resource_properties['FulfillmentLambda'],
+                                resource_properties['KendraSearchRole'],
+                                resource_properties['KendraIndex'],
+                                resource_properties['AccountID'])
+    lex_bot.pop('version', None)
+    lex_bot['processBehavior'] = 'BUILD'
+    lex_bot['createVersion'] = True
+    return {
+        'slotTypes': slot_types,
+        'intents': intents,
+        'bot': lex_bot,
+        'slotTypeVersions': {}
+    }
+
+
+def validate_bot_definition(lex_bot):
+    """
+    Validates an exported bot definition locally before it is compiled and before any Lex
+    API call is made. Built-in intents are skipped as they are dropped from the plan.
+    Raises ValueError describing the first problem found.
+    :param lex_bot: Bot description ('resource' of the bot export)
+    :return: None
+    """
+    if not lex_bot.get('name'):
+        raise ValueError("Lex bot definition has no name")
+    slot_type_names = set()
+    for slot_type in lex_bot.get('slotTypes', []):
+        if not slot_type.get('name'):
+            raise ValueError("Lex slot type definition has no name")
+        slot_type_names.add(slot_type['name'])
+    intent_names = set()
+    for intent in lex_bot.get('intents', []):
+        if not intent.get('name'):
+            raise ValueError("Lex intent definition has no name")
+        if intent['name'].startswith('AMAZON.'):
+            continue
+        if 'fulfillmentActivity' not in intent:
+            raise ValueError("Lex intent " + intent['name'] + " has no fulfillmentActivity")
+        if intent['name'] in intent_names:
+            raise ValueError("Lex intent " + intent['name'] + " is defined more than once")
+        intent_names.add(intent['name'])
+        for slot in intent.get('slots', []):
+            slot_type = slot.get('slotType', '')
+            if not slot_type.startswith('AMAZON.') and slot_type not in slot_type_names:
+                raise ValueError("Lex intent " + intent['name'] + " uses undefined slot type "
+                                 + slot_type)
+
+
+def load_bot_plan(resource_properties):
+    """
+    Loads the provisioning plan of the Lex bot.
+    The plan is served from the /tmp cache when the bot export (by ETag) and the resource
+    properties are unchanged; otherwise the export is downloaded, compiled and validated.
+    :param resource_properties: Dictionary of resources properties
+    :return: Cache key and compiled bot plan
+    """
+    etag = get_s3_object_etag(resource_properties['LexS3Bucket'],
+                              resource_properties['LexFileKey'])
+    cache_key = get_plan_cache_key(etag, resource_properties)
+    plan = read_cached_plan(cache_key)
+    if plan is not None:
+        logger.info("Using cached bot plan %s", cache_key)
+        return cache_key, plan
+
+    lex_json = read_json_file_from_s3(resource_properties['LexS3Bucket'],
+                                      resource_properties['LexFileKey'])
+    validate_bot_definition(lex_json['resource'])
+    plan = compile_bot_plan(lex_json['resource'], resource_properties)
+    write_cached_plan(cache_key, plan)
+    return cache_key, plan
+
+
+def create_lex_intents(intents, slot_type_version):
+    """
+    Creates Lex intents.
+    :param intents: List of patched Lex intents
+    :param slot_type_version: Map of Slot type versions.
+    :return: List of intents (Name and Version)
+    """
+    intent_list = []
+    for intent in intents:
+        intent = copy.deepcopy(intent)
+        for slot in intent.get('slots', []):
+            if 'slotType' in slot and slot['slotType'] in slot_type_version:
+                slot['slotTypeVersion'] = slot_type_version[slot['slotType']]
         try:
             intent_get_response = lex_client.get_intent(name=intent['name'], version='$LATEST')
             intent['checksum'] = intent_get_response['checksum']
@@ -91,48 +285,59 @@ def create_lex_intents(fulfillment_lambda, intents, kendra_search_role_arn, kend
     return intent_list
 
 
-def create_lex_slot_types(slot_types):
+def create_lex_slot_types(slot_types, recorded_versions):
     """
     Creates Lex slot types.
+    A slot type whose $LATEST checksum still matches the one recorded when it was last put
+    is unchanged, so its recorded version is reused instead of putting it again.
     :param slot_types: List of Lex slot types.
-    :return: Map of Slot type versions.
+    :param recorded_versions: Map of slot type name to recorded version and checksum
+    :return: Map of slot type name to version and checksum
     """
-    slot_type_version = {}
+    slot_type_versions = {}
     for slot_type in slot_types:
-        slot_type.pop('version', None)
+        slot_type = copy.deepcopy(slot_type)
+        recorded = recorded_versions.get(slot_type['name'])
         try:
             slot_get_response = lex_client.get_slot_type(name=slot_type['name'], version='$LATEST')
             slot_type['checksum'] = slot_get_response['checksum']
         except lex_client.exceptions.NotFoundException:
             pass
+        if recorded is not None and slot_type.get('checksum') == recorded['checksum']:
+            slot_type_versions[slot_type['name']] = recorded
+            logger.info("Slot type %s is unchanged", str(slot_type['name']))
+            continue
         slot_type['createVersion'] = True
         slot_type_response = lex_client.put_slot_type(**slot_type)
-        slot_type_version[slot_type['name']] = slot_type_response['version']
+        slot_type_versions[slot_type['name']] = {'version': slot_type_response['version'],
+                                                 'checksum': slot_type_response['checksum']}
         logger.info("Created/updated slot type %s", str(slot_type['name']))
-    return slot_type_version
+    return slot_type_versions
 
 
-def create_lex_bot(lex_bot, fulfillment_lambda, kendra_search_role_arn, kendra_index_id, account_id):
+def create_lex_bot(plan):
     """
     Creates Lex Bot.
-    :param lex_bot: Bot description
-    :param fulfillment_lambda: ARN of fulfillment Lambda
-    :param kendra_search_role_arn: ARN of role created for creating custom Lex bot
-    :param kendra_index_id: Kendra Index ID
-    :param account_id: AWS Account ID
+    Slot type versions are recorded in the plan so later invocations can reuse them.
+    :param plan: Compiled bot plan
     :return: Lex Bot Name & version
     """
-    intent_list = []
-    slot_type_version = {}
-    if 'slotTypes' in lex_bot:
-        slot_type_version = create_lex_slot_types(lex_bot['slotTypes'])
-        del lex_bot['slotTypes']
-    if 'intents' in lex_bot:
-        intent_list = create_lex_intents(fulfillment_lambda, lex_bot['intents'], kendra_search_role_arn, kendra_index_id, account_id, slot_type_version)
+    slot_type_versions = create_lex_slot_types(plan['slotTypes'], plan['slotTypeVersions'])
+    plan['slotTypeVersions'] = slot_type_versions
+    return put_lex_bot(plan, create_lex_intents(
+        plan['intents'],
+        {name: recorded['version'] for name, recorded in slot_type_versions.items()}))
+
+
+def put_lex_bot(plan, intent_list):
+    """
+    Puts the bot of the plan, building a new version from the given intent versions.
+    :param plan: Compiled bot plan
+    :param intent_list: List of intents (Name and Version)
+    :return: Lex Bot Name & version
+    """
+    lex_bot = copy.deepcopy(plan['bot'])
     lex_bot['intents'] = intent_list
-    lex_bot['processBehavior'] = 'BUILD'
-    lex_bot['createVersion'] = True
-    lex_bot.pop('version', None)
     try:
         bot_get_response = lex_client.get_bot(name=lex_bot['name'], versionOrAlias='$LATEST')
         lex_bot['checksum'] = bot_get_response['checksum']
@@ -144,6 +349,94 @@ def create_lex_bot(lex_bot, fulfillment_lambda, kendra_search_role_arn, kendra_i
     return bot_response['name'], bot_response['version']
 
 
+def build_import_payload(plan):
+    """
+    Zips the bot of the plan in memory in the Lex import format, with the fulfillment Lambda
+    and Kendra index of this stack already patched in.
+    :param plan: Compiled bot plan
+    :return: Zip file content
+    """
+    lex_bot = copy.deepcopy(plan['bot'])
+    lex_bot.pop('processBehavior', None)
+    lex_bot.pop('createVersion', None)
+    lex_bot['version'] = '1'
+    lex_bot['intents'] = [dict(intent, version='1') for intent in plan['intents']]
+    export = {'metadata': IMPORT_METADATA, 'resource': lex_bot}
+    payload = io.BytesIO()
+    with zipfile.ZipFile(payload, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(lex_bot['name'] + '_Export.json', json.dumps(export))
+    return payload.getvalue()
+
+
+def wait_for_import(import_id):
+    """
+    Polls a Lex import job until it completes.
+    Raises an exception if the import fails or does not complete within IMPORT_TIMEOUT.
+    :param import_id: Import job Id
+    :return: None
+    """
+    deadline = time.time() + IMPORT_TIMEOUT
+    while True:
+        response = lex_client.get_import(importId=import_id)
+        status = response['importStatus']
+        logger.info("Import %s is %s", import_id, status)
+        if status == 'COMPLETE':
+            return
+        if status == 'FAILED':
+            raise Exception("Lex import failed: " + '; '.join(response.get('failureReason', [])))
+        if time.time() >= deadline:
+            raise Exception("Lex import " + import_id + " did not complete in time")
+        time.sleep(IMPORT_POLL_INTERVAL)
+
+
+def create_intent_version(intent_name):
+    """
+    Publishes the $LATEST of an intent as a version.
+    :param intent_name: Intent name
+    :return: Intent (Name and Version)
+    """
+    response = lex_client.create_intent_version(name=intent_name)
+    return {'intentName': intent_name, 'intentVersion': response['version']}
+
+
+def import_lex_bot(plan):
+    """
+    Creates Lex Bot through the Lex bulk import API.
+    An import only writes the $LATEST of the bot and its intents, so the intents are then
+    published as versions in parallel and the bot is built as a new version from them.
+    :param plan: Compiled bot plan
+    :return: Lex Bot Name & version
+    """
+    response = lex_client.start_import(payload=build_import_payload(plan), resourceType='BOT',
+                                       mergeStrategy='OVERWRITE_LATEST')
+    wait_for_import(response['importId'])
+    plan['slotTypeVersions'] = {}
+    with futures.ThreadPoolExecutor(max_workers=INTENT_VERSION_WORKERS) as executor:
+        intent_list = list(executor.map(create_intent_version,
+                                        [intent['name'] for intent in plan['intents']]))
+    logger.info("Imported bot %s with %d intents", plan['bot']['name'], len(intent_list))
+    return put_lex_bot(plan, intent_list)
+
+
+def provision_lex_bot(plan, provisioning_mode):
+    """
+    Creates Lex Bot with the requested provisioning mode.
+    BULK_IMPORT falls back to per-item put calls if the import fails. Plans with custom slot
+    types always use per-item put calls, since their intents must reference slot type
+    versions which only exist after the slot types are published.
+    :param plan: Compiled bot plan
+    :param provisioning_mode: 'BULK_IMPORT' or 'PER_ITEM'
+    :return: Lex Bot Name & version
+    """
+    if provisioning_mode == 'BULK_IMPORT' and not plan['slotTypes']:
+        try:
+            return import_lex_bot(plan)
+        except Exception as error:  # pylint: disable=broad-except
+            logger.warning("Bulk import failed, falling back to per-item put calls: %s",
+                           str(error))
+    return create_lex_bot(plan)
+
+
 @helper.create
 @helper.update
 def create(event, _):
@@ -169,11 +462,13 @@ def create(event, _):
     for resource_property in required_properties:
         check_required_properties(event['ResourceProperties'], resource_property)
 
-    lex_json = read_json_file_from_s3(event['ResourceProperties']['LexS3Bucket'],
-                                      event['ResourceProperties']['LexFileKey'])
+    provisioning_mode = event['ResourceProperties'].get('ProvisioningMode', 'PER_ITEM').upper()
+    if provisioning_mode not in ('BULK_IMPORT', 'PER_ITEM'):
+        raise ValueError("ProvisioningMode must be BULK_IMPORT or PER_ITEM")
 
-    bot_name, bot_version = create_lex_bot(lex_json['resource'],
-                              event['ResourceProperties']['FulfillmentLambda'], event['ResourceProperties']['KendraSearchRole'], event['ResourceProperties']['KendraIndex'], event['ResourceProperties']['AccountID'])
+    cache_key, plan = load_bot_plan(event['ResourceProperties'])
+    bot_name, bot_version = provision_lex_bot(plan, provisioning_mode)
+    write_cached_plan(cache_key, plan)
     helper.Data['BotName'] = bot_name
     helper.Data['BotVersion'] = bot_version
 
@@ -199,11 +494,27 @@ def check_bot_status(bot_name):
     raise Exception("Lex Bot is in " + status + " state")
 
 
+def check_kendra_index_status(kendra_index_id):
+    """
+    Checks status of the Kendra index the bot searches.
+    The bot is built while the index is still being created; only the alias waits for it.
+    Raises an exception if Kendra Index is in an unexpected state.
+    :param kendra_index_id: Kendra Index Id
+    :return: True if index is Active, False otherwise
+    """
+    response = kendra_client.describe_index(Id=kendra_index_id)
+    status = response['Status']
+    if status in ('DELETING', 'FAILED'):
+        raise Exception("Kendra Index is in " + status + " state")
+    return status == 'ACTIVE'
+
+
 @helper.poll_create
 @helper.poll_update
 def poll_create(event, _):
     """
     Helper function for resource creation, triggered every 2 minutes till resource is created.
+    The alias is put once the bot is built and the Kendra index is ACTIVE.
     Any exception raised is displayed in CloudFormation console.
     :param event: Event body
     :param _: Context (unused)
@@ -219,6 +530,8 @@ def poll_create(event, _):
 
     if not check_bot_status(bot_name):
         return None
+    if not check_kendra_index_status(event['ResourceProperties']['KendraIndex']):
+        return None
     try:
         bot_get_alias_response = lex_client.get_bot_alias(name='quickstart', botName = bot_name)
         bot_alias['checksum'] = bot_get_alias_response['checksum']
@@ -228,80 +541,210 @@ def poll_create(event, _):
     return bot_name
 
 
-def delete_intents(bot_name, intents):
+def call_with_retry(operation, retry_in_use=None, **kwargs):
+    """
+    Calls a Lex delete operation, retrying with exponential backoff on conflicts, throttling
+    and references which are still being removed.
+    A resource which is already gone counts as deleted.
+    :param operation: Lex client operation
+    :param retry_in_use: Predicate telling whether a ResourceInUseException is worth retrying,
+                         all are retried if None
+    :param kwargs: Arguments of the operation
+    :return: None
+    """
+    delay = 1
+    for attempt in range(1, TEARDOWN_MAX_ATTEMPTS + 1):
+        try:
+            operation(**kwargs)
+            return
+        except lex_client.exceptions.NotFoundException:
+            return
+        except lex_client.exceptions.ResourceInUseException as error:
+            if attempt == TEARDOWN_MAX_ATTEMPTS or \
+                    (retry_in_use is not None and not retry_in_use(error)):
+                raise
+        except (lex_client.exceptions.ConflictException,
+                lex_client.exceptions.LimitExceededException):
+            if attempt == TEARDOWN_MAX_ATTEMPTS:
+                raise
+        time.sleep(delay)
+        delay = min(delay * 2, SLEEP_TIME)
+
+
+def get_in_use_reference(error):
+    """
+    Gets the resource a ResourceInUseException reports as referencing the deleted one.
+    :param error: ResourceInUseException
+    :return: Name of the referencing resource, or None if the error does not tell
+    """
+    return (error.response.get('exampleReference') or {}).get('name')
+
+
+def get_bot_aliases(bot_name):
     """
-    Delete intents. (Not used)
+    Gets all aliases of a bot, following pagination.
     :param bot_name: Name of bot
-    :param intents: List of intents to be deleted
-    :return: List of slot types associated with delete intents
+    :return: List of alias names
     """
-    slot_types = set()
-    for intent in intents:
+    aliases = []
+    kwargs = {'botName': bot_name}
+    while True:
         try:
-            if intent['intentName'].startswith('AMAZON.'):
+            alias_response = lex_client.get_bot_aliases(**kwargs)
+        except lex_client.exceptions.NotFoundException:
+            return aliases
+        aliases.extend(alias['name'] for alias in alias_response['BotAliases'])
+        if not alias_response.get('nextToken'):
+            return aliases
+        kwargs['nextToken'] = alias_response['nextToken']
+
+
+def get_other_bot_intents(bot_name):
+    """
+    Gets the intents used by the $LATEST version of every bot other than bot_name.
+    :param bot_name: Name of bot being deleted
+    :return: Set of intent names
+    """
+    intent_names = set()
+    kwargs = {}
+    while True:
+        bots_response = lex_client.get_bots(**kwargs)
+        for bot in bots_response['bots']:
+            if bot['name'] == bot_name:
                 continue
-            intent_response = lex_client.get_intent(name=intent['intentName'], version='$LATEST')
-            for slot in intent_response['slots']:
-                if not slot['slotType'].startswith('AMAZON.'):
-                    slot_types.add(slot['slotType'])
-            lex_client.delete_intent(name=intent['intentName'])
-        except lex_client.exceptions.ConflictException:
-            time.sleep(SLEEP_TIME)
-            lex_client.delete_intent(name=intent['intentName'])
-        logger.info("Deleted intent %s of bot %s", str(intent['intentName']), bot_name)
-    return slot_types
+            bot_response = lex_client.get_bot(name=bot['name'], versionOrAlias='$LATEST')
+            intent_names.update(intent['intentName'] for intent in bot_response.get('intents', []))
+        if not bots_response.get('nextToken'):
+            return intent_names
+        kwargs['nextToken'] = bots_response['nextToken']
 
 
-def delete_slot_types(bot_name, slot_types):
+def get_intent_slot_types(intent_name):
+    """
+    Gets the custom slot types used by the $LATEST version of an intent.
+    :param intent_name: Name of intent
+    :return: Set of slot type names
     """
-    Delete slot types. (Not used)
+    try:
+        intent_response = lex_client.get_intent(name=intent_name, version='$LATEST')
+    except lex_client.exceptions.NotFoundException:
+        return set()
+    return {slot['slotType'] for slot in intent_response.get('slots', [])
+            if not slot['slotType'].startswith('AMAZON.')}
+
+
+def build_teardown_graph(bot_name, delete_orphans):
+    """
+    Builds the dependency graph of a bot teardown.
+    Each node maps to the set of nodes that must be deleted before it:
+    aliases first, then the bot, then its intents, then their slot types.
+    Intents and slot types are only included when delete_orphans is set, and only
+    if the $LATEST of no other bot references them; references Lex reports on delete
+    are handled by delete_teardown_node.
     :param bot_name: Name of bot
-    :param slot_types: Set/List of slot type names to be deleted
-    :return: None
+    :param delete_orphans: Delete intents and slot types of the bot
+    :return: Dependency graph keyed by (resource type, name)
     """
-    for slot_type in slot_types:
-        try:
-            lex_client.delete_slot_type(name=slot_type)
-        except lex_client.exceptions.ConflictException:
-            time.sleep(SLEEP_TIME)
-            lex_client.delete_slot_type(name=slot_type)
-        logger.info("Deleted slot type %s of bot %s", slot_type, bot_name)
+    graph = {}
+    alias_nodes = {('alias', alias) for alias in get_bot_aliases(bot_name)}
+    for alias_node in alias_nodes:
+        graph[alias_node] = set()
+    bot_node = ('bot', bot_name)
+    graph[bot_node] = set(alias_nodes)
+    if not delete_orphans:
+        return graph
+
+    try:
+        bot_response = lex_client.get_bot(name=bot_name, versionOrAlias='$LATEST')
+    except lex_client.exceptions.NotFoundException:
+        return graph
+    shared_intents = get_other_bot_intents(bot_name)
+    shared_slot_types = set()
+    for intent_name in shared_intents:
+        shared_slot_types.update(get_intent_slot_types(intent_name))
+
+    for intent in bot_response.get('intents', []):
+        intent_name = intent['intentName']
+        if intent_name.startswith('AMAZON.') or intent_name in shared_intents:
+            continue
+        intent_node = ('intent', intent_name)
+        graph[intent_node] = {bot_node}
+        for slot_type in get_intent_slot_types(intent_name) - shared_slot_types:
+            graph.setdefault(('slot_type', slot_type), set()).add(intent_node)
+    return graph
 
 
-def delete_bot_aliases(bot_name):
+def delete_teardown_node(bot_name, node):
     """
-    Delete aliases associated with bot.
+    Deletes the resource represented by a teardown graph node.
+    DeleteBot only marks the bot for deletion, so its intents stay referenced by it for a
+    while; such references are retried. An intent or slot type referenced by anything else
+    (e.g. a published version of another bot, or an intent outside any bot) is kept rather
+    than failing the teardown.
     :param bot_name: Name of bot
+    :param node: Tuple of resource type and name
     :return: None
     """
-    alias_response = lex_client.get_bot_aliases(botName=bot_name)
-    for alias in alias_response['BotAliases']:
-        try:
-            lex_client.delete_bot_alias(name=alias['name'], botName=bot_name)
-        except lex_client.exceptions.ConflictException:
-            time.sleep(SLEEP_TIME)
-            lex_client.delete_bot_alias(name=alias['name'], botName=bot_name)
-        logger.info("Deleted bot alias %s of bot %s", alias['name'], bot_name)
-
+    def is_own_reference(error):
+        reference = get_in_use_reference(error)
+        return reference is None or reference == bot_name
 
-def delete_lex_bot(bot_name):
+    resource_type, name = node
+    try:
+        if resource_type == 'alias':
+            call_with_retry(lex_client.delete_bot_alias, name=name, botName=bot_name)
+        elif resource_type == 'bot':
+            call_with_retry(lex_client.delete_bot, name=name)
+        elif resource_type == 'intent':
+            call_with_retry(lex_client.delete_intent, retry_in_use=is_own_reference, name=name)
+        else:
+            call_with_retry(lex_client.delete_slot_type, retry_in_use=is_own_reference,
+                            name=name)
+    except lex_client.exceptions.ResourceInUseException as error:
+        if resource_type not in ('intent', 'slot_type') or is_own_reference(error):
+            raise
+        logger.info("Kept %s %s of bot %s as it is still referenced: %s",
+                    resource_type, name, bot_name, str(error))
+        return
+    logger.info("Deleted %s %s of bot %s", resource_type, name, bot_name)
+
+
+def run_teardown(bot_name, graph):
+    """
+    Deletes the nodes of a teardown graph in parallel.
+    A node is deleted as soon as every node it depends on has been deleted.
+    :param bot_name: Name of bot
+    :param graph: Dependency graph from build_teardown_graph
+    :return: None
     """
-    Deletes Lex Bot.
-    Note that associated intents and slot types are not deleted to properly support updates.
-    An update which changes the bot name but uses one or more same intent or slot type names
-    will cause issues otherwise.
+    pending = {node: set(blockers) for node, blockers in graph.items()}
+    with futures.ThreadPoolExecutor(max_workers=TEARDOWN_WORKERS) as executor:
+        running = {}
+        while pending or running:
+            for node in [node for node, blockers in pending.items() if not blockers]:
+                del pending[node]
+                running[executor.submit(delete_teardown_node, bot_name, node)] = node
+            if not running:
+                raise Exception("Lex teardown graph has a cycle: " + str(sorted(pending)))
+            done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                future.result()
+                for blockers in pending.values():
+                    blockers.discard(node)
+
+
+def delete_lex_bot(bot_name, delete_orphans=False):
+    """
+    Deletes Lex Bot and its aliases.
+    Associated intents and slot types are only deleted when delete_orphans is set, since an
+    update which changes the bot name but reuses intent or slot type names would otherwise
+    break; intents and slot types used by other bots are always kept.
     :param bot_name: Name of bot to be deleted
+    :param delete_orphans: Delete intents and slot types no other bot references
     :return: None
     """
-    # bot = lex_client.get_bot(name=bot_name, versionOrAlias='$LATEST')
-    delete_bot_aliases(bot_name)
-    try:
-        lex_client.delete_bot(name=bot_name)
-    except lex_client.exceptions.ConflictException:
-        time.sleep(SLEEP_TIME)
-        lex_client.delete_bot(name=bot_name)
-    # slot_types = delete_intents(bot_name, bot['intents'])
-    # delete_slot_types(bot_name, slot_types)
+    run_teardown(bot_name, build_teardown_graph(bot_name, delete_orphans))
 
 
 @helper.delete
@@ -314,7 +757,9 @@ def delete(event, _):
     :return: None
     """
     logger.info("Got Delete")
-    delete_lex_bot(event['PhysicalResourceId'])
+    delete_orphans = event.get('ResourceProperties', {}).get(
+        'DeleteOrphanedIntents', 'false').lower() == 'true'
+    delete_lex_bot(event['PhysicalResourceId'], delete_orphans)
 
 
 def lambda_handler(event, context):
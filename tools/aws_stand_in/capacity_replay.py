@@ -0,0 +1,118 @@
+"""
+Replays the capacity policy of the Kendra capacity scaler (replay_policy) against a recorded
+IndexQueryCount series and checks its decisions.
+
+Without arguments the recorded series below is replayed and the resulting query capacity
+units are compared with the expected ones; the script exits with status 1 on a mismatch.
+With --series, a JSON list of query counts per 5 minute period (e.g. exported from
+CloudWatch) is replayed with the policy given on the command line and the timeline printed.
+
+Usage:
+    python tools/aws_stand_in/capacity_replay.py
+    python tools/aws_stand_in/capacity_replay.py --series counts.json [--max-units 4]
+        [--target-utilization 0.7] [--scale-down-utilization 0.4]
+"""
+import argparse
+import json
+import sys
+
+from lifecycle import load_function
+
+# IndexQueryCount sums per 5 minute period of an ENTERPRISE_EDITION index over four hours:
+# quiet start, morning ramp, one hour at peak, then back to quiet.
+RECORDED_EDITION = 'ENTERPRISE_EDITION'
+RECORDED_SERIES = [15] * 12 + [30, 45, 60, 90, 105, 120] + [120] * 12 + [60, 30] + [15] * 16
+RECORDED_POLICY = {
+    'minUnits': 0,
+    'maxUnits': 4,
+    'targetUtilization': 0.7,
+    'scaleDownUtilization': 0.4,
+    'scaleUpCooldown': 900,
+    'scaleDownCooldown': 3600
+}
+# Query capacity units in effect at each data point of RECORDED_SERIES: one unit on the ramp,
+# the maximum within one scale-up cool-down, one unit once the peak ends and none after the
+# scale-down cool-down.
+EXPECTED_UNITS = [0] * 13 + [1] * 3 + [4] * 16 + [1] * 12 + [0] * 4
+MAX_THROTTLED_PERIODS = 1
+
+
+def check_recorded_series(scaler):
+    """
+    Replays RECORDED_SERIES and checks the decisions against EXPECTED_UNITS.
+    :param scaler: kendra_capacity_scaler module
+    :return: List of problems, empty if the policy behaves as expected
+    """
+    timeline = scaler.replay_policy(RECORDED_EDITION, RECORDED_SERIES, 0, RECORDED_POLICY)
+    problems = []
+    units = [point['units'] for point in timeline]
+    if units != EXPECTED_UNITS:
+        problems.append('units %s, expected %s' % (units, EXPECTED_UNITS))
+    throttled = sum(1 for point in timeline if point['throttled'])
+    if throttled > MAX_THROTTLED_PERIODS:
+        problems.append('%d throttled periods, at most %d expected'
+                        % (throttled, MAX_THROTTLED_PERIODS))
+    return problems
+
+
+def print_timeline(timeline):
+    """
+    :param timeline: Result of replay_policy
+    :return: None
+    """
+    print("%6s %8s %6s %12s %10s  %s" % ('period', 'qps', 'units', 'utilization', 'throttled',
+                                          'reason'))
+    for position, point in enumerate(timeline):
+        print("%6d %8.3f %6d %11.0f%% %10s  %s" % (
+            position, point['qps'], point['units'], 100 * point['utilization'],
+            'yes' if point['throttled'] else '', point['reason']))
+
+
+def main():
+    """
+    Command line entry point.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--series', help='JSON list of query counts per period')
+    parser.add_argument('--edition', default=RECORDED_EDITION)
+    parser.add_argument('--initial-units', type=int, default=0)
+    parser.add_argument('--min-units', type=int, default=RECORDED_POLICY['minUnits'])
+    parser.add_argument('--max-units', type=int, default=RECORDED_POLICY['maxUnits'])
+    parser.add_argument('--target-utilization', type=float,
+                        default=RECORDED_POLICY['targetUtilization'])
+    parser.add_argument('--scale-down-utilization', type=float,
+                        default=RECORDED_POLICY['scaleDownUtilization'])
+    parser.add_argument('--scale-up-cooldown', type=float,
+                        default=RECORDED_POLICY['scaleUpCooldown'])
+    parser.add_argument('--scale-down-cooldown', type=float,
+                        default=RECORDED_POLICY['scaleDownCooldown'])
+    args = parser.parse_args()
+    scaler = load_function('kendra_capacity_scaler')
+
+    if not args.series:
+        problems = check_recorded_series(scaler)
+        print_timeline(scaler.replay_policy(RECORDED_EDITION, RECORDED_SERIES, 0,
+                                            RECORDED_POLICY))
+        for problem in problems:
+            print("FAILED: " + problem)
+        if problems:
+            sys.exit(1)
+        print("Recorded series: OK")
+        return
+
+    with open(args.series) as series_file:
+        series = json.load(series_file)
+    policy = {
+        'minUnits': args.min_units,
+        'maxUnits': args.max_units,
+        'targetUtilization': args.target_utilization,
+        'scaleDownUtilization': args.scale_down_utilization,
+        'scaleUpCooldown': args.scale_up_cooldown,
+        'scaleDownCooldown': args.scale_down_cooldown
+    }
+    print_timeline(scaler.replay_policy(args.edition, series, args.initial_units, policy))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,795 @@
+"""
+In-process stand-ins for the Kendra, Lex model building and S3 operations used by the
+Quick Start Lambda functions.
+State transitions (index CREATING to ACTIVE, bot BUILDING to READY) follow a virtual clock,
+so a full stack lifecycle can be replayed offline in milliseconds.
+"""
+import copy
+import datetime
+import functools
+import hashlib
+import io
+import json
+import random
+import threading
+import uuid
+import zipfile
+from botocore.exceptions import ClientError
+
+
+class VirtualClock:
+    """
+    Virtual clock shared by the stand-ins and the code under test.
+    Exposes time() and sleep() so it can replace the time module of a custom resource.
+    Sleeping advances the clock instead of blocking.
+    """
+
+    def __init__(self, start=0.0):
+        self._now = start
+        self._lock = threading.Lock()
+
+    def time(self):
+        """
+        :return: Current virtual time in seconds
+        """
+        with self._lock:
+            return self._now
+
+    def set(self, now):
+        """
+        Moves the clock to a point in time, as done by discrete-event simulations.
+        :param now: Virtual time in seconds
+        :return: None
+        """
+        with self._lock:
+            self._now = now
+
+    monotonic = time
+
+    def sleep(self, seconds):
+        """
+        Advances the virtual clock.
+        :param seconds: Seconds to advance
+        :return: None
+        """
+        with self._lock:
+            self._now += max(seconds, 0)
+
+
+class FaultConfig:
+    """
+    Latency, throttling and failure injection settings of a stand-in.
+    :param latency: Map of operation name to virtual seconds per call ('default' applies to
+                    every operation not listed)
+    :param throttle_rate: Probability of raising ThrottlingException on any call
+    :param seed: Seed for the random generator used for throttling
+    """
+
+    def __init__(self, latency=None, throttle_rate=0.0, seed=0):
+        self.latency = {'default': 0.05}
+        self.latency.update(latency or {})
+        self.throttle_rate = throttle_rate
+        self.random = random.Random(seed)
+        self.failures = {}
+
+    def fail_next(self, operation, error_code, message='Injected failure', count=1):
+        """
+        Makes the next calls of an operation raise an error.
+        :param operation: Operation name, e.g. 'create_index'
+        :param error_code: Error code, e.g. 'InternalServerException'
+        :param message: Error message
+        :param count: Number of calls to fail
+        :return: None
+        """
+        self.failures.setdefault(operation, []).extend([(error_code, message)] * count)
+
+
+def make_exceptions(*error_codes):
+    """
+    Builds an 'exceptions' namespace like the one of a boto3 client.
+    Every class is a ClientError subclass whose error code is the class name.
+    :param error_codes: Error codes to model
+    :return: Namespace object
+    """
+    namespace = type('Exceptions', (), {})()
+    for error_code in error_codes:
+        setattr(namespace, error_code, type(error_code, (ClientError,), {}))
+    return namespace
+
+
+class FakeService:
+    """
+    Base class of the stand-ins: call accounting, latency, throttling and failure injection.
+    """
+    ERROR_CODES = ('ThrottlingException', 'ConflictException', 'ValidationException',
+                   'InternalServerException', 'ResourceNotFoundException')
+
+    def __init__(self, clock, faults=None):
+        self.clock = clock
+        self.faults = faults or FaultConfig()
+        self.exceptions = make_exceptions(*self.ERROR_CODES)
+        self.calls = {}
+        self._lock = threading.RLock()
+
+    def error(self, error_code, message, operation, **fields):
+        """
+        Builds a modelled service error.
+        :param error_code: Error code
+        :param message: Error message
+        :param operation: Operation name
+        :param fields: Modelled fields of the error, e.g. exampleReference
+        :return: Exception instance
+        """
+        error_class = getattr(self.exceptions, error_code, None)
+        error_response = dict(fields, Error={'Code': error_code, 'Message': message})
+        if error_class is None:
+            return ClientError(error_response, operation)
+        return error_class(error_response, operation)
+
+    def _enter(self, operation):
+        """
+        Accounts for a call and applies latency and injected faults.
+        :param operation: Operation name
+        :return: None
+        """
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            pending = self.faults.failures.get(operation)
+            failure = pending.pop(0) if pending else None
+            throttled = self.faults.random.random() < self.faults.throttle_rate
+        self.clock.sleep(self.faults.latency.get(operation, self.faults.latency['default']))
+        if failure:
+            raise self.error(failure[0], failure[1], operation)
+        if throttled:
+            raise self.error('ThrottlingException', 'Rate exceeded', operation)
+
+
+def operation(func):
+    """
+    Decorator for stand-in operations: serialises calls and applies FakeService._enter.
+    :param func: Operation implementation
+    :return: Wrapped operation
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            self._enter(func.__name__)
+            return func(self, *args, **kwargs)
+    return wrapper
+
+
+def checksum_of(document):
+    """
+    :param document: JSON serialisable resource definition
+    :return: Checksum of the definition
+    """
+    return hashlib.md5(json.dumps(document, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class FakeKendra(FakeService):
+    """
+    Stand-in for the Kendra operations used by the custom resource and the fulfillment Lambda.
+    Queries are limited to the query capacity of the index (edition plus additional query
+    capacity units) and raise ThrottlingException beyond it.
+    :param clock: VirtualClock
+    :param faults: FaultConfig
+    :param index_creation_time: Virtual seconds an index stays in CREATING
+    :param index_deletion_time: Virtual seconds an index stays in DELETING
+    :param query_burst_seconds: Seconds of sustained query capacity absorbed as a burst
+    :param index_update_time: Virtual seconds an index stays in UPDATING after update_index
+    """
+    # Approximate sustained queries per second of each edition, and per additional query
+    # capacity unit; bursts of query_burst_seconds (QUERY_BURST_SECONDS by default) worth of
+    # queries are absorbed, and at least one query. Kendra does not publish its burst
+    # allowance; at 0.05 queries per second a shorter burst rounds down to a single query and
+    # Poisson traffic is throttled far below the sustained capacity.
+    EDITION_QPS = {'DEVELOPER_EDITION': 0.05, 'ENTERPRISE_EDITION': 0.1}
+    QPS_PER_QUERY_UNIT = 0.1
+    QUERY_BURST_SECONDS = 120
+
+    def __init__(self, clock, faults=None, index_creation_time=1800, index_deletion_time=300,
+                 query_burst_seconds=None, index_update_time=60):
+        FakeService.__init__(self, clock, faults)
+        self.index_update_time = index_update_time
+        self.query_burst_seconds = self.QUERY_BURST_SECONDS if query_burst_seconds is None \
+            else query_burst_seconds
+        self.index_creation_time = index_creation_time
+        self.index_deletion_time = index_deletion_time
+        self.indexes = {}
+        self.query_responses = {}
+
+    def query_capacity(self, index_id):
+        """
+        :param index_id: Index Id
+        :return: Sustained queries per second the index accepts
+        """
+        index = self.indexes[index_id]
+        return self.EDITION_QPS.get(index['Edition'], 0.05) + \
+            self.QPS_PER_QUERY_UNIT * index['CapacityUnits'].get('QueryCapacityUnits', 0)
+
+    def _take_query_token(self, index_id):
+        index = self.indexes[index_id]
+        capacity = self.query_capacity(index_id)
+        burst = max(capacity * self.query_burst_seconds, 1.0)
+        now = self.clock.time()
+        if index['query_tokens'] is None:
+            index['query_tokens'] = burst
+        else:
+            index['query_tokens'] = min(
+                burst, index['query_tokens'] + max(now - index['query_updated'], 0) * capacity)
+        index['query_updated'] = max(now, index['query_updated'] or now)
+        if index['query_tokens'] < 1:
+            raise self.error('ThrottlingException', 'Query capacity exceeded', 'query')
+        index['query_tokens'] -= 1
+
+    def _index(self, index_id, operation):
+        index = self.indexes.get(index_id)
+        if index is None or self._status(index) == 'DELETED':
+            raise self.error('ResourceNotFoundException', 'Index not found: ' + index_id,
+                             operation)
+        return index
+
+    def _status(self, index):
+        now = self.clock.time()
+        if index['deleted_at'] is not None:
+            if now >= index['deleted_at'] + self.index_deletion_time:
+                return 'DELETED'
+            return 'DELETING'
+        if index['failure']:
+            return 'FAILED'
+        if now < index['active_at']:
+            return 'CREATING'
+        if now < index['updated_until']:
+            return 'UPDATING'
+        return 'ACTIVE'
+
+    def fail_index_creation(self, index_id, message):
+        """
+        Moves an index to FAILED.
+        :param index_id: Index Id
+        :param message: Error message reported by describe_index
+        :return: None
+        """
+        self.indexes[index_id]['failure'] = message
+
+    @operation
+    def create_index(self, Name, Edition, RoleArn, Description=None, **kwargs):
+        index_id = str(uuid.uuid4())
+        self.indexes[index_id] = {
+            'Name': Name, 'Edition': Edition, 'RoleArn': RoleArn, 'Description': Description,
+            'CapacityUnits': kwargs.get('CapacityUnits', {'QueryCapacityUnits': 0,
+                                                          'StorageCapacityUnits': 0}),
+            'active_at': self.clock.time() + self.index_creation_time,
+            'updated_until': 0.0, 'deleted_at': None, 'failure': None,
+            'query_tokens': None, 'query_updated': None,
+            'data_sources': {}, 'faqs': {}, 'sync_jobs': {}
+        }
+        return {'Id': index_id}
+
+    @operation
+    def describe_index(self, Id):
+        index = self._index(Id, 'describe_index')
+        response = {'Id': Id, 'Name': index['Name'], 'Edition': index['Edition'],
+                    'Status': self._status(index), 'CapacityUnits': index['CapacityUnits']}
+        if index['failure']:
+            response['ErrorMessage'] = index['failure']
+        return response
+
+    @operation
+    def update_index(self, Id, **kwargs):
+        index = self._index(Id, 'update_index')
+        if self._status(index) != 'ACTIVE':
+            raise self.error('ConflictException', 'Index is not ACTIVE', 'update_index')
+        if 'CapacityUnits' in kwargs:
+            index['CapacityUnits'] = dict(kwargs['CapacityUnits'])
+        index['updated_until'] = self.clock.time() + self.index_update_time
+        return {}
+
+    @operation
+    def delete_index(self, Id):
+        index = self._index(Id, 'delete_index')
+        index['deleted_at'] = self.clock.time()
+        return {}
+
+    def _active_index(self, index_id, operation, statuses=('ACTIVE',)):
+        index = self._index(index_id, operation)
+        if self._status(index) not in statuses:
+            raise self.error('ConflictException', 'Index is not ACTIVE', operation)
+        return index
+
+    @operation
+    def create_data_source(self, Name, IndexId, Type, RoleArn, Configuration=None, **_):
+        index = self._active_index(IndexId, 'create_data_source')
+        data_source_id = str(uuid.uuid4())
+        index['data_sources'][data_source_id] = {'Name': Name, 'Type': Type,
+                                                 'Configuration': Configuration}
+        return {'Id': data_source_id}
+
+    @operation
+    def list_data_sources(self, IndexId, NextToken=None, MaxResults=10):
+        index = self._index(IndexId, 'list_data_sources')
+        items = [{'Name': data_source['Name'], 'Id': data_source_id}
+                 for data_source_id, data_source in sorted(index['data_sources'].items())]
+        start = int(NextToken or 0)
+        response = {'SummaryItems': items[start:start + MaxResults]}
+        if start + MaxResults < len(items):
+            response['NextToken'] = str(start + MaxResults)
+        return response
+
+    @operation
+    def describe_data_source(self, Id, IndexId):
+        data_source = self._data_source(Id, IndexId, 'describe_data_source')
+        response = {'Id': Id, 'IndexId': IndexId, 'Name': data_source['Name'],
+                    'Type': data_source['Type'], 'Status': 'ACTIVE'}
+        if data_source['Configuration']:
+            response['Configuration'] = copy.deepcopy(data_source['Configuration'])
+        return response
+
+    @operation
+    def update_data_source(self, Id, IndexId, Configuration=None, **_):
+        data_source = self._data_source(Id, IndexId, 'update_data_source')
+        if Configuration is not None:
+            data_source['Configuration'] = copy.deepcopy(Configuration)
+        return {}
+
+    def _data_source(self, data_source_id, index_id, operation):
+        index = self._index(index_id, operation)
+        if data_source_id not in index['data_sources']:
+            raise self.error('ResourceNotFoundException',
+                             'Data source not found: ' + data_source_id, operation)
+        return index['data_sources'][data_source_id]
+
+    @operation
+    def start_data_source_sync_job(self, Id, IndexId):
+        index = self._active_index(IndexId, 'start_data_source_sync_job')
+        if Id not in index['data_sources']:
+            raise self.error('ResourceNotFoundException', 'Data source not found: ' + Id,
+                             'start_data_source_sync_job')
+        execution_id = str(uuid.uuid4())
+        index['sync_jobs'][execution_id] = {'DataSourceId': Id, 'StartTime': self.clock.time()}
+        return {'ExecutionId': execution_id}
+
+    @operation
+    def create_faq(self, Name, IndexId, S3Path, RoleArn, **_):
+        index = self._active_index(IndexId, 'create_faq')
+        faq_id = str(uuid.uuid4())
+        index['faqs'][faq_id] = {'Name': Name, 'S3Path': S3Path}
+        return {'Id': faq_id}
+
+    @operation
+    def list_faqs(self, IndexId, NextToken=None, MaxResults=10):
+        index = self._index(IndexId, 'list_faqs')
+        items = [{'Name': faq['Name'], 'Id': faq_id}
+                 for faq_id, faq in sorted(index['faqs'].items())]
+        start = int(NextToken or 0)
+        response = {'FaqSummaryItems': items[start:start + MaxResults]}
+        if start + MaxResults < len(items):
+            response['NextToken'] = str(start + MaxResults)
+        return response
+
+    def set_query_response(self, index_id, response):
+        """
+        Sets the response returned by query for an index.
+        :param index_id: Index Id
+        :param response: Kendra query response
+        :return: None
+        """
+        self.query_responses[index_id] = response
+
+    @operation
+    def query(self, IndexId, QueryText, **_):
+        self._active_index(IndexId, 'query', ('ACTIVE', 'UPDATING'))
+        self._take_query_token(IndexId)
+        return self.query_responses.get(IndexId, {'QueryId': str(uuid.uuid4()),
+                                                  'ResultItems': [],
+                                                  'TotalNumberOfResults': 0})
+
+
+class FakeLexModels(FakeService):
+    """
+    Stand-in for the Lex model building operations used by the Lex custom resource.
+    Versions, checksums and reference conflicts follow the Lex V1 semantics.
+    :param clock: VirtualClock
+    :param faults: FaultConfig
+    :param build_time: Virtual seconds a bot stays in BUILDING
+    :param import_time: Virtual seconds an import job stays IN_PROGRESS
+    :param bot_deletion_time: Virtual seconds a deleted bot keeps referencing its intents, as
+                              DeleteBot only marks the bot for deletion
+    """
+    ERROR_CODES = FakeService.ERROR_CODES + ('NotFoundException', 'PreconditionFailedException',
+                                             'ResourceInUseException', 'LimitExceededException',
+                                             'BadRequestException')
+
+    def __init__(self, clock, faults=None, build_time=60, import_time=10, bot_deletion_time=5):
+        FakeService.__init__(self, clock, faults)
+        self.build_time = build_time
+        self.import_time = import_time
+        self.bot_deletion_time = bot_deletion_time
+        self.slot_types = {}
+        self.intents = {}
+        self.bots = {}
+        self.deleting_bots = {}
+        self.aliases = {}
+        self.imports = {}
+        self.import_failure = None
+
+    def _get(self, store, name, operation):
+        if name not in store:
+            raise self.error('NotFoundException', 'Not found: ' + str(name), operation)
+        return store[name]
+
+    def _put(self, store, name, definition, operation):
+        """
+        Stores $LATEST of a resource and optionally a numbered version.
+        :return: Stored resource
+        """
+        definition = dict(definition)
+        checksum = definition.pop('checksum', None)
+        create_version = definition.pop('createVersion', False)
+        resource = store.get(name)
+        if resource is not None and checksum != resource['checksum']:
+            raise self.error('PreconditionFailedException', 'Checksum mismatch for ' + name,
+                             operation)
+        if resource is None and checksum is not None:
+            raise self.error('NotFoundException', 'Not found: ' + str(name), operation)
+        if resource is None:
+            resource = store[name] = {'versions': {}}
+        resource['latest'] = definition
+        resource['checksum'] = checksum_of(definition)
+        version = '$LATEST'
+        if create_version:
+            existing = [number for number, body in resource['versions'].items()
+                        if body == definition]
+            version = existing[0] if existing else str(len(resource['versions']) + 1)
+            resource['versions'][version] = definition
+        return dict(definition, checksum=resource['checksum'], version=version)
+
+    @operation
+    def get_slot_type(self, name, version):
+        slot_type = self._get(self.slot_types, name, 'get_slot_type')
+        return dict(slot_type['latest'], name=name, checksum=slot_type['checksum'],
+                    version=version)
+
+    @operation
+    def put_slot_type(self, **kwargs):
+        return self._put(self.slot_types, kwargs['name'], kwargs, 'put_slot_type')
+
+    @operation
+    def get_intent(self, name, version):
+        intent = self._get(self.intents, name, 'get_intent')
+        return dict(intent['latest'], name=name, checksum=intent['checksum'], version=version)
+
+    @operation
+    def put_intent(self, **kwargs):
+        for slot in kwargs.get('slots', []):
+            if not slot['slotType'].startswith('AMAZON.') and \
+                    slot['slotType'] not in self.slot_types:
+                raise self.error('BadRequestException', 'Unknown slot type ' + slot['slotType'],
+                                 'put_intent')
+        return self._put(self.intents, kwargs['name'], kwargs, 'put_intent')
+
+    def _bot_status(self, bot):
+        if bot['failure']:
+            return 'FAILED'
+        if self.clock.time() < bot['ready_at']:
+            return 'BUILDING'
+        return 'READY'
+
+    @operation
+    def get_bot(self, name, versionOrAlias):
+        bot = self._get(self.bots, name, 'get_bot')
+        response = dict(bot['latest'], name=name, checksum=bot['checksum'],
+                        version=versionOrAlias, status=self._bot_status(bot))
+        if bot['failure']:
+            response['failureReason'] = bot['failure']
+        return response
+
+    @operation
+    def get_bots(self, nextToken=None, maxResults=10):
+        names = sorted(self.bots)
+        start = int(nextToken or 0)
+        response = {'bots': [{'name': name} for name in names[start:start + maxResults]]}
+        if start + maxResults < len(names):
+            response['nextToken'] = str(start + maxResults)
+        return response
+
+    def fail_bot_build(self, name, reason):
+        """
+        Moves a bot to FAILED.
+        :param name: Bot name
+        :param reason: Failure reason reported by get_bot
+        :return: None
+        """
+        self.bots[name]['failure'] = reason
+
+    @operation
+    def put_bot(self, **kwargs):
+        bot = self.bots.get(kwargs['name'])
+        if bot is not None and self._bot_status(bot) == 'BUILDING':
+            raise self.error('ConflictException', 'Bot is building', 'put_bot')
+        for intent in kwargs.get('intents', []):
+            if intent['intentName'] not in self.intents:
+                raise self.error('BadRequestException', 'Unknown intent ' + intent['intentName'],
+                                 'put_bot')
+        response = self._put(self.bots, kwargs['name'], kwargs, 'put_bot')
+        bot = self.bots[kwargs['name']]
+        bot['failure'] = None
+        bot['ready_at'] = self.clock.time()
+        if kwargs.get('processBehavior', 'SAVE') == 'BUILD':
+            bot['ready_at'] += self.build_time
+        response['status'] = self._bot_status(bot)
+        return response
+
+    @operation
+    def get_bot_alias(self, name, botName):
+        return dict(self._get(self.aliases, (botName, name), 'get_bot_alias'))
+
+    @operation
+    def put_bot_alias(self, name, botName, botVersion, checksum=None, **_):
+        bot = self._get(self.bots, botName, 'put_bot_alias')
+        if botVersion != '$LATEST' and botVersion not in bot['versions']:
+            raise self.error('NotFoundException', 'Unknown bot version ' + botVersion,
+                             'put_bot_alias')
+        alias = self.aliases.get((botName, name))
+        if alias is not None and checksum != alias['checksum']:
+            raise self.error('PreconditionFailedException', 'Checksum mismatch for ' + name,
+                             'put_bot_alias')
+        alias = {'name': name, 'botName': botName, 'botVersion': botVersion}
+        alias['checksum'] = checksum_of(alias)
+        self.aliases[(botName, name)] = alias
+        return dict(alias)
+
+    @operation
+    def get_bot_aliases(self, botName, nextToken=None, maxResults=10):
+        names = sorted(name for bot_name, name in self.aliases if bot_name == botName)
+        start = int(nextToken or 0)
+        response = {'BotAliases': [dict(self.aliases[(botName, name)])
+                                   for name in names[start:start + maxResults]]}
+        if start + maxResults < len(names):
+            response['nextToken'] = str(start + maxResults)
+        return response
+
+    @operation
+    def delete_bot_alias(self, name, botName):
+        self._get(self.aliases, (botName, name), 'delete_bot_alias')
+        del self.aliases[(botName, name)]
+        return {}
+
+    @operation
+    def delete_bot(self, name):
+        bot = self._get(self.bots, name, 'delete_bot')
+        aliases = sorted(alias for bot_name, alias in self.aliases if bot_name == name)
+        if aliases:
+            raise self.error('ResourceInUseException', 'Bot has aliases', 'delete_bot',
+                             referenceType='BotAlias',
+                             exampleReference={'name': aliases[0], 'version': '$LATEST'})
+        del self.bots[name]
+        self.deleting_bots[name] = (bot, self.clock.time() + self.bot_deletion_time)
+        return {}
+
+    def _bot_reference(self, intent_name):
+        """
+        :return: exampleReference of a bot version using the intent, None if unused
+        """
+        now = self.clock.time()
+        bots = list(self.bots.items()) + [(name, bot) for name, (bot, deleted_at)
+                                          in self.deleting_bots.items() if now < deleted_at]
+        for bot_name, bot in bots:
+            versions = [('$LATEST', bot['latest'])] + sorted(bot['versions'].items())
+            for version, body in versions:
+                if any(intent['intentName'] == intent_name for intent in body.get('intents', [])):
+                    return {'name': bot_name, 'version': version}
+        return None
+
+    @operation
+    def delete_intent(self, name):
+        self._get(self.intents, name, 'delete_intent')
+        reference = self._bot_reference(name)
+        if reference is not None:
+            raise self.error('ResourceInUseException', 'Intent is used by a bot',
+                             'delete_intent', referenceType='BotVersion',
+                             exampleReference=reference)
+        del self.intents[name]
+        return {}
+
+    @operation
+    def delete_slot_type(self, name):
+        self._get(self.slot_types, name, 'delete_slot_type')
+        for intent_name, intent in sorted(self.intents.items()):
+            if any(slot['slotType'] == name for slot in intent['latest'].get('slots', [])):
+                raise self.error('ResourceInUseException', 'Slot type is used by an intent',
+                                 'delete_slot_type', referenceType='Intent',
+                                 exampleReference={'name': intent_name, 'version': '$LATEST'})
+        del self.slot_types[name]
+        return {}
+
+    @operation
+    def create_intent_version(self, name, checksum=None):
+        intent = self._get(self.intents, name, 'create_intent_version')
+        if checksum is not None and checksum != intent['checksum']:
+            raise self.error('PreconditionFailedException', 'Checksum mismatch for ' + name,
+                             'create_intent_version')
+        return self._put(self.intents, name, dict(intent['latest'], checksum=intent['checksum'],
+                                                  createVersion=True), 'create_intent_version')
+
+    def fail_imports(self, reason):
+        """
+        Makes import jobs started from now on fail.
+        :param reason: Failure reason reported by get_import, None to stop failing
+        :return: None
+        """
+        self.import_failure = reason
+
+    def _import_latest(self, store, name, definition, merge_strategy):
+        existing = store.get(name)
+        if existing is not None and merge_strategy == 'FAIL_ON_CONFLICT':
+            raise ValueError(name + ' already exists')
+        self._put(store, name, dict(definition, checksum=existing and existing['checksum']),
+                  'start_import')
+
+    @operation
+    def start_import(self, payload, resourceType, mergeStrategy, tags=None):
+        import_id = uuid.uuid4().hex
+        job = {'importId': import_id, 'resourceType': resourceType,
+               'mergeStrategy': mergeStrategy, 'createdDate': self.clock.time(),
+               'ready_at': self.clock.time() + self.import_time, 'failure': self.import_failure}
+        if job['failure'] is None:
+            try:
+                with zipfile.ZipFile(io.BytesIO(payload)) as archive:
+                    export = json.loads(archive.read(archive.namelist()[0]).decode('utf-8'))
+                if export['metadata'].get('importType') != 'LEX':
+                    raise ValueError('Unsupported import type')
+                resource = dict(export['resource'])
+                for slot_type in resource.pop('slotTypes', []):
+                    slot_type = dict(slot_type)
+                    slot_type.pop('version', None)
+                    self._import_latest(self.slot_types, slot_type['name'], slot_type,
+                                        mergeStrategy)
+                intents = []
+                for intent in resource.pop('intents', []):
+                    intent = dict(intent)
+                    intent.pop('version', None)
+                    self._import_latest(self.intents, intent['name'], intent, mergeStrategy)
+                    intents.append({'intentName': intent['name'], 'intentVersion': '$LATEST'})
+                resource.pop('version', None)
+                resource['intents'] = intents
+                self._import_latest(self.bots, resource['name'], resource, mergeStrategy)
+                self.bots[resource['name']].update(failure=None, ready_at=self.clock.time())
+                job['name'] = resource['name']
+            except (ValueError, KeyError, IndexError, zipfile.BadZipFile) as error:
+                job['failure'] = str(error)
+        self.imports[import_id] = job
+        return {'importId': import_id, 'importStatus': 'IN_PROGRESS',
+                'resourceType': resourceType, 'mergeStrategy': mergeStrategy}
+
+    @operation
+    def get_import(self, importId):
+        job = self._get(self.imports, importId, 'get_import')
+        response = {key: value for key, value in job.items()
+                    if key not in ('ready_at', 'failure')}
+        if self.clock.time() < job['ready_at']:
+            response['importStatus'] = 'IN_PROGRESS'
+        elif job['failure']:
+            response['importStatus'] = 'FAILED'
+            response['failureReason'] = [job['failure']]
+        else:
+            response['importStatus'] = 'COMPLETE'
+        return response
+
+
+class FakeS3Object:
+    """
+    Stand-in for boto3 s3.Object.
+    """
+
+    def __init__(self, store, bucket_name, key):
+        self._store = store
+        self.bucket_name = bucket_name
+        self.key = key
+
+    @property
+    def e_tag(self):
+        return self._store.head_object(Bucket=self.bucket_name, Key=self.key)['ETag']
+
+    def get(self):
+        return self._store.get_object(Bucket=self.bucket_name, Key=self.key)
+
+
+class _Body:
+    def __init__(self, data):
+        self._data = data
+
+    def read(self):
+        return self._data
+
+
+class FakeS3(FakeService):
+    """
+    Stand-in for the S3 client and resource, backed by an in-memory object store.
+    """
+
+    def __init__(self, clock, faults=None):
+        FakeService.__init__(self, clock, faults)
+        self.faults.latency.setdefault('generate_presigned_url', 0.0)  # Signed locally
+        self.objects = {}
+        self.modified = {}
+
+    def put(self, bucket_name, key, body):
+        """
+        Stores an object.
+        :param bucket_name: Bucket name
+        :param key: Object key
+        :param body: Bytes or str
+        :return: None
+        """
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.objects[(bucket_name, key)] = body
+        self.modified[(bucket_name, key)] = self.clock.time()
+
+    def Object(self, bucket_name, key):  # pylint: disable=invalid-name
+        return FakeS3Object(self, bucket_name, key)
+
+    def Bucket(self, bucket_name):  # pylint: disable=invalid-name
+        store = self
+        return type('Bucket', (), {'Object': lambda _, key: FakeS3Object(store, bucket_name,
+                                                                         key)})()
+
+    def _body(self, bucket_name, key, operation_name):
+        if (bucket_name, key) not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': key}}, operation_name)
+        return self.objects[(bucket_name, key)]
+
+    @operation
+    def head_object(self, Bucket, Key):
+        body = self._body(Bucket, Key, 'HeadObject')
+        return {'ETag': '"' + hashlib.md5(body).hexdigest() + '"', 'ContentLength': len(body)}
+
+    @operation
+    def get_object(self, Bucket, Key):
+        body = self._body(Bucket, Key, 'GetObject')
+        return {'Body': _Body(body), 'ETag': '"' + hashlib.md5(body).hexdigest() + '"',
+                'ContentLength': len(body)}
+
+    @operation
+    def put_object(self, Bucket, Key, Body, **_):
+        self.put(Bucket, Key, Body)
+        return {'ETag': '"' + hashlib.md5(self.objects[(Bucket, Key)]).hexdigest() + '"'}
+
+    @operation
+    def list_objects_v2(self, Bucket, ContinuationToken=None, MaxKeys=1000, Prefix=''):
+        keys = sorted(key for bucket_name, key in self.objects
+                      if bucket_name == Bucket and key.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        response = {'KeyCount': len(keys[start:start + MaxKeys]), 'Contents': [
+            {'Key': key, 'Size': len(self.objects[(Bucket, key)]),
+             'LastModified': datetime.datetime.fromtimestamp(self.modified[(Bucket, key)],
+                                                             datetime.timezone.utc)}
+            for key in keys[start:start + MaxKeys]]}
+        if start + MaxKeys < len(keys):
+            response['IsTruncated'] = True
+            response['NextContinuationToken'] = str(start + MaxKeys)
+        return response
+
+    def get_paginator(self, operation_name):
+        """
+        :param operation_name: 'list_objects_v2'
+        :return: Paginator following NextContinuationToken
+        """
+        store = self
+
+        class Paginator:  # pylint: disable=too-few-public-methods
+            @staticmethod
+            def paginate(**kwargs):
+                while True:
+                    page = getattr(store, operation_name)(**kwargs)
+                    yield page
+                    if not page.get('IsTruncated'):
+                        return
+                    kwargs['ContinuationToken'] = page['NextContinuationToken']
+        return Paginator()
+
+    @operation
+    def generate_presigned_url(self, client_method, Params, ExpiresIn=3600):
+        return 'https://{}.s3.amazonaws.com/{}?X-Amz-Expires={}'.format(
+            Params['Bucket'], Params['Key'], ExpiresIn)
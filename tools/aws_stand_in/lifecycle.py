@@ -0,0 +1,276 @@
+"""
+Drives the crhelper create, poll and delete lifecycle of the Kendra and Lex custom resources
+end to end against the in-process stand-ins, and reports virtual wall-clock time and API
+calls per phase.
+
+Usage:
+    python tools/aws_stand_in/lifecycle.py [--index-creation-time 1800] [--build-time 60]
+        [--lex-provisioning-mode PER_ITEM|BULK_IMPORT] [--fail-import]
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import tempfile
+
+from fake_aws import VirtualClock, FakeKendra, FakeLexModels, FakeS3
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+SOURCE_DIR = os.path.join(REPO_ROOT, 'functions', 'source')
+BOT_EXPORT = os.path.join(REPO_ROOT, 'assets', 'lex-bot-template', 'covid_bot_Export.json')
+POLL_INTERVAL = 120  # crhelper default polling interval in seconds
+
+
+def load_function(function_name, module_name=None, **attributes):
+    """
+    Imports a Lambda function module from functions/source and rebinds its module level
+    clients (and time module) to the given stand-ins.
+    :param function_name: Folder of the function under functions/source
+    :param module_name: Module to import, defaults to function_name
+    :param attributes: Module attributes to replace, e.g. kendra_client=FakeKendra(...)
+    :return: Imported module
+    """
+    os.environ.setdefault('AWS_REGION', 'us-east-1')
+    os.environ.setdefault('AWS_DEFAULT_REGION', os.environ['AWS_REGION'])
+    function_dir = os.path.join(SOURCE_DIR, function_name)
+    if function_dir not in sys.path:
+        sys.path.insert(0, function_dir)
+    module = importlib.import_module(module_name or function_name)
+    for name, value in attributes.items():
+        setattr(module, name, value)
+    return module
+
+
+class LifecycleRunner:
+    """
+    Replays the invocations crhelper makes for one custom resource.
+    :param module: Custom resource module
+    :param clock: VirtualClock shared with the stand-ins
+    :param services: Stand-ins whose calls are reported per phase
+    :param poll_interval: Virtual seconds between poll invocations
+    :param max_polls: Polls after which the resource is considered stuck
+    """
+
+    def __init__(self, module, clock, services, poll_interval=POLL_INTERVAL, max_polls=100):
+        self.module = module
+        self.clock = clock
+        self.services = services
+        self.poll_interval = poll_interval
+        self.max_polls = max_polls
+        self.phases = []
+        self._phase_calls = {}
+
+    def _call_counts(self):
+        counts = {}
+        for service in self.services:
+            for operation, count in service.calls.items():
+                counts[operation] = counts.get(operation, 0) + count
+        return counts
+
+    def _invoke(self, handler, event):
+        """
+        Invokes a handler and adds the API calls it made to the current phase, so that
+        resources provisioned side by side on shared stand-ins are accounted separately.
+        """
+        helper = self.module.helper
+        helper.Data = dict(event.get('CrHelperData', {}))
+        calls_before = self._call_counts()
+        result = handler(event, None)
+        for operation, count in self._call_counts().items():
+            if count != calls_before.get(operation, 0):
+                self._phase_calls[operation] = self._phase_calls.get(operation, 0) + \
+                    count - calls_before.get(operation, 0)
+        return result, dict(helper.Data)
+
+    def _record(self, name, started_at, polls):
+        self.phases.append({
+            'phase': name,
+            'seconds': self.clock.time() - started_at,
+            'polls': polls,
+            'calls': self._phase_calls
+        })
+        self._phase_calls = {}
+
+    def create_steps(self, resource_properties, request_type='Create', physical_resource_id=None,
+                     resource_type=None):
+        """
+        Generator running the create (or update) handler and then one poll per step until
+        the poll returns a physical resource id. The caller advances the clock between steps.
+        :param resource_properties: ResourceProperties of the custom resource
+        :param request_type: 'Create' or 'Update'
+        :param physical_resource_id: PhysicalResourceId for updates
+        :param resource_type: ResourceType of the custom resource, e.g. Custom::KendraIndexReadiness
+        :return: Physical resource id and response Data (as the StopIteration value)
+        """
+        started_at = self.clock.time()
+        event = {'RequestType': request_type, 'ResourceProperties': resource_properties}
+        if physical_resource_id:
+            event['PhysicalResourceId'] = physical_resource_id
+        if resource_type:
+            event['ResourceType'] = resource_type
+        _, data = self._invoke(self.module.create, event)
+        polls = 0
+        while True:
+            if polls == self.max_polls:
+                raise Exception("Resource not ready after " + str(polls) + " polls")
+            yield
+            polls += 1
+            event['CrHelperData'] = data
+            physical_resource_id, data = self._invoke(self.module.poll_create, event)
+            if physical_resource_id:
+                break
+        self._record(request_type, started_at, polls)
+        return physical_resource_id, data
+
+    def create(self, resource_properties, request_type='Create', physical_resource_id=None,
+               resource_type=None):
+        """
+        Runs the create (or update) handler and polls until it returns a physical resource id.
+        :param resource_properties: ResourceProperties of the custom resource
+        :param request_type: 'Create' or 'Update'
+        :param physical_resource_id: PhysicalResourceId for updates
+        :param resource_type: ResourceType of the custom resource
+        :return: Physical resource id and response Data
+        """
+        return create_concurrently(self.clock, [(self, {
+            'resource_properties': resource_properties, 'request_type': request_type,
+            'physical_resource_id': physical_resource_id, 'resource_type': resource_type})],
+                                   self.poll_interval)[0]
+
+    def delete(self, physical_resource_id, resource_properties, resource_type=None):
+        """
+        Runs the delete handler.
+        :param physical_resource_id: PhysicalResourceId of the custom resource
+        :param resource_properties: ResourceProperties of the custom resource
+        :param resource_type: ResourceType of the custom resource
+        :return: None
+        """
+        started_at = self.clock.time()
+        event = {'RequestType': 'Delete', 'PhysicalResourceId': physical_resource_id,
+                 'ResourceProperties': resource_properties}
+        if resource_type:
+            event['ResourceType'] = resource_type
+        self._invoke(self.module.delete, event)
+        self._record('Delete', started_at, 0)
+
+
+def create_concurrently(clock, requests, poll_interval=POLL_INTERVAL):
+    """
+    Runs the create lifecycles of custom resources side by side, the way CloudFormation
+    provisions resources that do not depend on each other. Handler invocations themselves
+    are serialised on the virtual clock.
+    :param clock: VirtualClock shared with the stand-ins
+    :param requests: List of (LifecycleRunner, keyword arguments of create_steps)
+    :param poll_interval: Virtual seconds between poll invocations
+    :return: List of (physical resource id, response Data), in the order of requests
+    """
+    steps = [runner.create_steps(**kwargs) for runner, kwargs in requests]
+    results = [None] * len(steps)
+    pending = list(range(len(steps)))
+    while pending:
+        for position in list(pending):
+            try:
+                next(steps[position])
+            except StopIteration as stop:
+                results[position] = stop.value
+                pending.remove(position)
+        if pending:
+            clock.sleep(poll_interval)
+    return results
+
+
+def run_stack(index_creation_time=1800, build_time=60, clock=None,
+              lex_provisioning_mode='PER_ITEM', fail_import=False):
+    """
+    Provisions and tears down the Kendra index and the Lex bot the way the master template
+    orders them, against fresh stand-ins: the index first, then its readiness resource (data
+    source and FAQ) and the Lex bot side by side.
+    :param index_creation_time: Virtual seconds the index stays in CREATING
+    :param build_time: Virtual seconds the bot stays in BUILDING
+    :param clock: VirtualClock, a new one if not given
+    :param lex_provisioning_mode: ProvisioningMode of the Lex custom resource
+    :param fail_import: Make Lex import jobs fail, to exercise the per-item fallback
+    :return: List of phase reports
+    """
+    clock = clock or VirtualClock()
+    kendra = FakeKendra(clock, index_creation_time=index_creation_time)
+    lex = FakeLexModels(clock, build_time=build_time)
+    if fail_import:
+        lex.fail_imports('Injected import failure')
+    s3_store = FakeS3(clock)
+    with open(BOT_EXPORT, 'rb') as export_file:
+        s3_store.put('artifacts', 'covid_bot_Export.json', export_file.read())
+    s3_store.put('documents', 'policies/travel-policy.pdf', b'%PDF travel policy')
+    s3_store.put('documents', 'policies/leave-policy.pdf', b'%PDF leave policy')
+    s3_store.put('documents', 'COVID_FAQ.csv', b'question,answer')
+
+    kendra_module = load_function('kendra_custom_resource', kendra_client=kendra,
+                                  s3_client=s3_store, time=clock,
+                                  MANIFEST_PATH=os.path.join(tempfile.mkdtemp(),
+                                                             'manifest.sqlite'))
+    lex_module = load_function('lex_custom_resource', lex_client=lex, kendra_client=kendra,
+                               s3_resource=s3_store,
+                               time=clock, PLAN_CACHE_DIR=tempfile.mkdtemp())
+
+    kendra_properties = {
+        'IndexName': 'stand-in-index', 'Edition': 'DEVELOPER_EDITION',
+        'IndexRoleArn': 'arn:aws:iam::123456789012:role/index'
+    }
+    kendra_runner = LifecycleRunner(kendra_module, clock, [kendra])
+    index_id, _ = kendra_runner.create(kendra_properties,
+                                       resource_type='Custom::KendraCustomResource')
+
+    readiness_properties = {
+        'IndexId': index_id, 'Edition': 'DEVELOPER_EDITION', 'DataSourceName': 'docs',
+        'KendraS3Bucket': 'documents', 'DataSourceRoleArn': 'arn:aws:iam::123456789012:role/ds',
+        'FAQName': 'faqs', 'FAQRoleArn': 'arn:aws:iam::123456789012:role/faq',
+        'FAQFileKey': 'COVID_FAQ.csv'
+    }
+    readiness_runner = LifecycleRunner(kendra_module, clock, [kendra, s3_store])
+
+    lex_properties = {
+        'LexS3Bucket': 'artifacts', 'LexFileKey': 'covid_bot_Export.json',
+        'FulfillmentLambda': 'arn:aws:lambda:us-east-1:123456789012:function:fulfillment',
+        'KendraSearchRole': 'arn:aws:iam::123456789012:role/lex', 'KendraIndex': index_id,
+        'AccountID': '123456789012', 'DeleteOrphanedIntents': 'true',
+        'ProvisioningMode': lex_provisioning_mode
+    }
+    lex_runner = LifecycleRunner(lex_module, clock, [lex, s3_store, kendra])
+    (readiness_id, _), (bot_name, _) = create_concurrently(clock, [
+        (readiness_runner, {'resource_properties': readiness_properties,
+                            'resource_type': 'Custom::KendraIndexReadiness'}),
+        (lex_runner, {'resource_properties': lex_properties})])
+
+    lex_runner.delete(bot_name, lex_properties)
+    readiness_runner.delete(readiness_id, readiness_properties, 'Custom::KendraIndexReadiness')
+    kendra_runner.delete(index_id, kendra_properties, 'Custom::KendraCustomResource')
+    return [dict(phase, resource='Kendra') for phase in kendra_runner.phases[:1]] + \
+        [dict(phase, resource='KendraReadiness') for phase in readiness_runner.phases[:1]] + \
+        [dict(phase, resource='Lex') for phase in lex_runner.phases] + \
+        [dict(phase, resource='KendraReadiness') for phase in readiness_runner.phases[1:]] + \
+        [dict(phase, resource='Kendra') for phase in kendra_runner.phases[1:]]
+
+
+def main():
+    """
+    Command line entry point.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--index-creation-time', type=float, default=1800)
+    parser.add_argument('--build-time', type=float, default=60)
+    parser.add_argument('--lex-provisioning-mode', choices=('PER_ITEM', 'BULK_IMPORT'),
+                        default='PER_ITEM')
+    parser.add_argument('--fail-import', action='store_true')
+    args = parser.parse_args()
+    clock = VirtualClock()
+    phases = run_stack(args.index_creation_time, args.build_time, clock,
+                       lex_provisioning_mode=args.lex_provisioning_mode,
+                       fail_import=args.fail_import)
+    print(json.dumps(phases, indent=2))
+    print("Total virtual seconds: %.1f" % clock.time())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""
+Load test of the Kendra Search Intent Lambda function and one Kendra index.
+Simulates up to N concurrent Lambda containers, each with its own cold start and warm state,
+serving Poisson chat traffic. Each turn is replayed the way Lex runs it: Lex queries the
+index, and then lambda_handler runs with the kendraResponse, or with none if Lex was
+throttled. The index enforces the query capacity of its edition and query capacity units.
+Virtual time is advanced by the modelled Kendra latency, the cold start and the measured
+handler time. Prints throughput (turns answered by Lex or Kendra, not degraded replies) and
+latency per offered load and the saturation point of each index configuration.
+
+Usage:
+    python tools/aws_stand_in/loadtest.py [--base-rate 0.05] [--multipliers 1,2,4,6,8,10,12]
+        [--containers 10] [--duration 900] [--configs DEVELOPER_EDITION:0,ENTERPRISE_EDITION:0]
+        [--query-burst-seconds 120] [--csv results.csv]
+"""
+import argparse
+import csv
+import heapq
+import logging
+import os
+import random
+import sys
+import time
+
+from fake_aws import VirtualClock, FaultConfig, FakeKendra, FakeS3
+from lifecycle import REPO_ROOT, load_function
+
+LAMBDA_MODULES = ('config', 'helpers', 'utterance_index', 'admission', 'federated_search',
+                  'telemetry', 'profiling', 'document_manifest', 'lambda_function')
+FAQ_FILE = os.path.join(REPO_ROOT, 'assets', 'FAQ-document', 'COVID_FAQ.csv')
+INDEX_ID = 'load-test-index'
+# Serving tiers which answer from the index; static, cached and degraded replies are not counted
+ANSWERING_TIERS = ('lex', 'kendra')
+FREE_FORM_QUESTIONS = [
+    'How do I claim reimbursement for a covid test',
+    'Is the cafeteria open on weekends',
+    'What is the policy for visitors in the office',
+    'Can I work from another city',
+    'Who do I contact if a colleague tests positive',
+    'Are business trips allowed next month'
+]
+
+
+def load_transcripts():
+    """
+    Builds the mix of transcripts reaching the Kendra fallback: FAQ questions and free-form
+    questions no static intent covers.
+    :return: List of transcripts
+    """
+    transcripts = list(FREE_FORM_QUESTIONS)
+    with open(FAQ_FILE, encoding='utf-8', errors='replace') as faq_file:
+        transcripts.extend(row[0] for row in csv.reader(faq_file) if row)
+    return transcripts
+
+
+class Container:
+    """
+    One simulated Lambda container with its own copy of the function's modules.
+    """
+
+    def __init__(self, clock, kendra, s3_store):
+        for name in LAMBDA_MODULES:
+            sys.modules.pop(name, None)
+        started = time.perf_counter()
+        load_function('kendra_search_intent_handler_lambda', 'lambda_function')
+        self.init_seconds = time.perf_counter() - started
+        self.modules = {name: sys.modules.pop(name) for name in LAMBDA_MODULES}
+        self.modules['helpers'].s3_client = s3_store
+        self.modules['federated_search'].kendra_client = kendra
+        admission = self.modules['admission']
+        admission.controller.clock = clock.time
+        admission.controller.bucket.clock = clock.time
+        admission.controller.bucket.updated = clock.time()
+        admission.answer_cache.clock = clock.time
+        self.handler = self.modules['lambda_function'].lambda_handler
+        self.warm = False
+
+    def tier_counts(self):
+        """
+        :return: Requests served per tier by this container
+        """
+        return self.modules['admission'].controller.get_counters()
+
+
+def percentile(values, fraction):
+    """
+    :param values: Sorted list of values
+    :param fraction: Percentile as a fraction
+    :return: Value at the percentile
+    """
+    if not values:
+        return 0.0
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def run_load_point(rate, args, edition, query_units, transcripts, seed):
+    """
+    Simulates `args.duration` virtual seconds of Poisson traffic at `rate` requests per second.
+    :return: Result row
+    """
+    clock = VirtualClock()
+    kendra = FakeKendra(clock, FaultConfig(latency={'query': args.kendra_latency}),
+                        index_creation_time=0, query_burst_seconds=args.query_burst_seconds)
+    kendra.indexes[INDEX_ID] = kendra.indexes.pop(kendra.create_index(
+        Name='load-test', Edition=edition, RoleArn='role',
+        CapacityUnits={'QueryCapacityUnits': query_units, 'StorageCapacityUnits': 0})['Id'])
+    kendra.set_query_response(INDEX_ID, {'ResultItems': [{
+        'Type': 'QUESTION_ANSWER', 'ScoreAttributes': {'ScoreConfidence': 'HIGH'},
+        'DocumentExcerpt': {'Text': 'Answer from the load test index'}}]})
+    s3_store = FakeS3(clock)
+    lex_format = None
+    randomizer = random.Random(seed)
+
+    containers = []  # heap of (free at, position, container)
+    arrival = 0.0
+    latencies = []
+    lex_throttles = 0
+    while True:
+        arrival += randomizer.expovariate(rate)
+        if arrival > args.duration:
+            break
+        if containers and (containers[0][0] <= arrival or len(containers) == args.containers):
+            free_at, position, container = heapq.heappop(containers)
+        else:
+            free_at, position, container = arrival, len(containers), \
+                Container(clock, kendra, s3_store)
+            lex_format = lex_format or container.modules['federated_search'].to_lex_format
+        start = max(arrival, free_at)
+        clock.set(start)
+        if not container.warm:
+            clock.sleep(container.init_seconds + args.cold_start)
+            container.warm = True
+
+        transcript = randomizer.choice(transcripts)
+        try:
+            kendra_response = lex_format(kendra.query(IndexId=INDEX_ID, QueryText=transcript))
+        except kendra.exceptions.ThrottlingException:
+            kendra_response = None
+            lex_throttles += 1
+        handler_started = time.perf_counter()
+        container.handler({'currentIntent': {'name': 'Kendra_Search_Intent', 'slots': {},
+                                             'slotDetails': {}},
+                           'inputTranscript': transcript,
+                           'kendraResponse': kendra_response}, None)
+        clock.sleep(time.perf_counter() - handler_started)
+        latencies.append(clock.time() - arrival)
+        heapq.heappush(containers, (clock.time(), position, container))
+
+    latencies.sort()
+    tiers = {}
+    for _, _, container in containers:
+        for tier, count in container.tier_counts().items():
+            tiers[tier] = tiers.get(tier, 0) + count
+    answered = sum(tiers.get(tier, 0) for tier in ANSWERING_TIERS)
+    return {
+        'edition': edition,
+        'queryUnits': query_units,
+        'offeredRps': rate,
+        'throughputRps': answered / args.duration,
+        'p50': percentile(latencies, 0.5),
+        'p95': percentile(latencies, 0.95),
+        'p99': percentile(latencies, 0.99),
+        'kendraThrottleRate': float(lex_throttles) / max(len(latencies), 1),
+        'containers': len(containers),
+        'tiers': tiers
+    }
+
+
+def find_saturation(rows, max_throttle_rate, latency_factor):
+    """
+    Finds the first offered load at which the index saturates: Kendra throttles more than
+    max_throttle_rate of turns, or p95 latency exceeds latency_factor times the lightest load.
+    :param rows: Result rows of one configuration, by increasing load
+    :return: Offered requests per second at saturation, 0.0 if the lightest load tested is
+             already saturated, or None if no load tested saturates the index
+    """
+    baseline = rows[0]['p95']
+    for position, row in enumerate(rows):
+        if row['kendraThrottleRate'] > max_throttle_rate or row['p95'] > latency_factor * baseline:
+            return row['offeredRps'] if position else 0.0
+    return None
+
+
+def main():
+    """
+    Command line entry point.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--base-rate', type=float, default=0.05,
+                        help='Normal chat traffic in requests per second')
+    parser.add_argument('--multipliers', default='1,2,4,6,8,10,12')
+    parser.add_argument('--containers', type=int, default=10,
+                        help='Maximum concurrent Lambda containers')
+    parser.add_argument('--duration', type=float, default=900, help='Virtual seconds per load')
+    parser.add_argument('--configs', default='DEVELOPER_EDITION:0,ENTERPRISE_EDITION:0,'
+                                             'ENTERPRISE_EDITION:1',
+                        help='Comma separated <edition>:<additional query capacity units>')
+    parser.add_argument('--kendra-latency', type=float, default=0.25,
+                        help='Virtual seconds per Kendra query')
+    parser.add_argument('--query-burst-seconds', type=float,
+                        default=FakeKendra.QUERY_BURST_SECONDS,
+                        help='Seconds of sustained query capacity the index absorbs as a burst')
+    parser.add_argument('--cold-start', type=float, default=0.5,
+                        help='Virtual seconds of runtime start-up added to module import')
+    parser.add_argument('--max-throttle-rate', type=float, default=0.01)
+    parser.add_argument('--latency-factor', type=float, default=2.0)
+    parser.add_argument('--csv', help='Write result rows to this CSV file')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'load-test')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'load-test')
+    os.environ.setdefault('KENDRA_DATA_BUCKET', 'load-test')
+    os.environ['KENDRA_INDEX'] = INDEX_ID
+    os.environ.pop('KENDRA_FEDERATED_INDEXES', None)
+    os.environ.pop('TELEMETRY_SINK', None)
+    logging.disable(logging.CRITICAL)
+    transcripts = load_transcripts()
+
+    all_rows = []
+    for config in args.configs.split(','):
+        edition, _, query_units = config.partition(':')
+        rows = [run_load_point(args.base_rate * float(multiplier), args, edition,
+                               int(query_units or 0), transcripts, args.seed)
+                for multiplier in args.multipliers.split(',')]
+        all_rows.extend(rows)
+        print("\n%s + %s query units" % (edition, query_units or 0))
+        print("%10s %10s %8s %8s %8s %9s %5s  %s" % ('offered', 'answered', 'p50', 'p95', 'p99',
+                                                     'throttle', 'cont', 'tiers'))
+        for row in rows:
+            print("%10.3f %10.3f %8.3f %8.3f %8.3f %8.1f%% %5d  %s" % (
+                row['offeredRps'], row['throughputRps'], row['p50'], row['p95'], row['p99'],
+                100 * row['kendraThrottleRate'], row['containers'],
+                ' '.join('%s=%d' % item for item in sorted(row['tiers'].items()))))
+        saturation = find_saturation(rows, args.max_throttle_rate, args.latency_factor)
+        if saturation is None:
+            print("Saturation point: not reached")
+        elif saturation == 0.0:
+            print("Saturation point: below the lowest load tested (%.3f requests/s)"
+                  % rows[0]['offeredRps'])
+        else:
+            print("Saturation point: %.3f requests/s" % saturation)
+
+    if args.csv:
+        with open(args.csv, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=list(all_rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(all_rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Compiles the sample utterances and closing responses of the static intents of a Lex bot export
+into the n-gram index packaged with the Kendra Search Intent Lambda function.
+
+Usage:
+    python tools/build_utterance_index.py [--export assets/lex-bot-template/covid_bot_Export.json]
+                                          [--output <lambda folder>/utterance_index.json]
+"""
+import argparse
+import json
+import os
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+FUNCTION_DIR = os.path.join(REPO_ROOT, 'functions', 'source',
+                            'kendra_search_intent_handler_lambda')
+sys.path.insert(0, FUNCTION_DIR)
+
+import utterance_index  # pylint: disable=wrong-import-position
+
+
+def get_static_intents(lex_bot):
+    """
+    Gets the intents answered with a static closing response.
+    Code hook intents (such as Kendra_Search_Intent) and built-in intents are skipped.
+    :param lex_bot: Bot description ('resource' of the bot export)
+    :return: List of (intent name, closing response, sample utterances)
+    """
+    intents = []
+    for intent in lex_bot.get('intents', []):
+        if intent['name'].startswith('AMAZON.') or 'parentIntentSignature' in intent:
+            continue
+        if intent['fulfillmentActivity']['type'] != 'ReturnIntent':
+            continue
+        messages = intent.get('conclusionStatement', {}).get('messages', [])
+        if not messages or not intent.get('sampleUtterances'):
+            continue
+        intents.append((intent['name'], messages[0]['content'], intent['sampleUtterances']))
+    return intents
+
+
+def main():
+    """
+    Command line entry point.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--export', default=os.path.join(
+        REPO_ROOT, 'assets', 'lex-bot-template', 'covid_bot_Export.json'))
+    parser.add_argument('--output', default=utterance_index.INDEX_FILE)
+    args = parser.parse_args()
+
+    with open(args.export) as export_file:
+        lex_bot = json.load(export_file)['resource']
+    intents = get_static_intents(lex_bot)
+    index = utterance_index.build(intents)
+    with open(args.output, 'w') as index_file:
+        json.dump(index, index_file, separators=(',', ':'), sort_keys=True)
+    print("Indexed %d utterances of %d intents into %s"
+          % (len(index['doc_intents']), len(intents), args.output))
+
+
+if __name__ == '__main__':
+    main()